@@ -1,7 +1,18 @@
+import argparse
+import sys
+from pathlib import Path
+from typing import Sequence
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from pretty_python.export import RESOLUTIONS, export_figure  # noqa: E402
+from pretty_python.images import load_image  # noqa: E402
+from pretty_python.tracing import stage, traced  # noqa: E402
+
 # Data scraped from https://asb.opec.org/ASB_Charts.html?chapter=223
 DATA = [
     {"country": "Other", "reserves_bbl": 12.2 + 2.52 + 2 + 1.81 + 1.1},
@@ -18,11 +29,17 @@ DATA = [
 COLORS = ["#222", "#333", "#444", "#555", "#666", "#777", "#888", "#999", "#aaa"]
 
 
-def main():
-    """Main function."""
+def main(sizes: Sequence[str] = ("print",)):
+    """Main function.
+
+    Args:
+        sizes (Sequence[str]): The sizes of the chart to write.
+    """
     df = pd.DataFrame(DATA)
     df.sort_values(by="reserves_bbl", ascending=False, inplace=True)
-    plot_oil_reserves_between_opec_countries(df)
+    fig = plot_oil_reserves_between_opec_countries(df)
+    with stage("savefig", output="oil_reserves.png"):
+        export_figure(fig, "oil_reserves.png", sizes, facecolor="#f4f0e8")
 
 
 def func(pct: float, allvals: pd.Series) -> str:
@@ -37,10 +54,13 @@ def func(pct: float, allvals: pd.Series) -> str:
     return f"{pct:.1f}%\n({absolute:d} BBLS)"
 
 
-def plot_oil_reserves_between_opec_countries(df: pd.DataFrame) -> None:
+@traced
+def plot_oil_reserves_between_opec_countries(df: pd.DataFrame):
     """Plot oil reserves between OPEC countries.
     Args:
         df (pd.DataFrame): Dataframe with oil reserves data.
+    Returns:
+        matplotlib.figure.Figure: The chart, ready to be saved.
     """
     # Create a pieplot
     fig, ax = plt.subplots(
@@ -80,14 +100,22 @@ def plot_oil_reserves_between_opec_countries(df: pd.DataFrame) -> None:
     p = plt.gcf()
     p.gca().add_artist(my_circle)
 
-    # add oil pump image
-    img = plt.imread("./oil-pump.png")
+    # add oil pump image, decoded only on the first run
+    img = load_image("./oil-pump.png")
     newax = fig.add_axes([0.375, 0.375, 0.3, 0.3], zorder=1)
     newax.imshow(img)
     newax.axis("off")
-
-    plt.savefig("oil_reserves.png", dpi=300, bbox_inches="tight", facecolor="#f4f0e8")
+    return fig
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="OPEC countries oil reserves")
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        choices=RESOLUTIONS,
+        default=["print"],
+        help="The sizes of the chart to write, from one draw",
+    )
+    args = parser.parse_args()
+    main(sizes=args.sizes)
@@ -1,7 +1,21 @@
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, TextIO
+
 import pandas as pd
 import numpy as np
-from IPython.display import HTML
-from pandas.io.formats.style import Styler
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from pretty_python.assets import AssetRegistry  # noqa: E402
+from pretty_python.cells import CellTemplate  # noqa: E402
+from pretty_python.html_table import HtmlTable, open_output  # noqa: E402
+from pretty_python.loaders import load_table  # noqa: E402
+from pretty_python.tracing import stage, traced  # noqa: E402
 
 CUSTOM_STYLE = [
     # Table column headers
@@ -54,6 +68,47 @@ CUSTOM_STYLE = [
     },
 ]
 
+# Table caption, shown as a footer
+CAPTION = (
+    '<div style="padding-top: 20px; display: flex; justify-content:space-between">'
+    '<div style="order: 1">'
+    '<span style="text-align:left; display: inline; color: #787878;'
+    'font-size: 12px;"> Source: <strong>AccuWeather</strong> | #30DayChartChallenge'
+    " | Day 2</span></div>"
+    '<div style="order:2">'
+    '<img style="margin-bottom:-2px; display:inline" '
+    'src="images/twitter.svg" width=12/>'
+    '<span style="color: #787878; font-size:12px; text-align:right">'
+    " @masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
+    '<img style="margin-bottom:-2px; display:inline" '
+    'src="images/github.svg" width=12/>'
+    '<span style="color: #787878; font-size:12px; text-align:right">'
+    " ilko-masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
+    '<img style="margin-bottom:-2px; display:inline" '
+    'src="images/linkedin.svg" width=12/>'
+    '<span style="color: #787878; font-size:12px; text-align:right">'
+    " masaldzhiyski</span></div></div>"
+)
+
+TABLE_ATTRIBUTES = (
+    'style="border-spacing: 0px; margin-left: auto; margin-right: auto;"'
+)
+
+# The city and month of a calendar in batch mode, shown above the caption
+CALENDAR_TITLE = (
+    '<div style="font-family: Archivo; font-size: 16px; font-weight: bold;'
+    ' color: #2f2f2f; padding-top: 10px;">{city} &middot; {month}</div>'
+)
+
+# Where the cells find the icons, relative to the HTML file
+IMAGES = "./images"
+
+# The columns of a long-format forecast table, one row per city and date
+FORECAST_COLUMNS = ["city", "date", "icon", "low", "high"]
+
+# The columns of a calendar
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
 # Create a data frame with values. Scraped from AccuWeather
 DATA = [
     {
@@ -201,6 +256,71 @@ DATA = [
 ]
 
 
+# The weather records indexed by day, so cells look up their day directly
+WEATHER = pd.DataFrame(DATA).set_index("day")
+
+# The padding cells before the first and after the last day of the month
+EMPTY_CELL = CellTemplate(
+    '<img class="square" width=85px src="{images}/square_light_blue.svg">'
+)
+
+# Every day of the month, rendered for the whole calendar at once
+DAY_CELL = CellTemplate(
+    '<div style="position: relative;">'
+    '<img class="square" width=85px src="{images}/square_blue.svg"/>'
+    '<img style="position: absolute; top:25px; left:30px;" width=35px src="{images}/{icon}.svg"/>'
+    '<div style="position: absolute; top: 0; left: 0; width: 100%; height: 100%; text-align: center; vertical-align: bottom; font-weight: bold;">'
+    '<span style="position: absolute; top: 10px; left: 0; width: 100%; height: 100%; text-align: center; font-size: 12px; font-weight: bold; color: #007DFE;">{day}</span>'
+    "</div>"
+    '<div style="position: absolute; top: 70px; left: 0; width: 100%; height: 100%; text-align: center; vertical-align: bottom; font-weight: bold;">'
+    '<span style="color: black; font-size:12px">{high}&deg; </span>'
+    '<span style="color: gray; font-size:8px">/{low}&deg;</span>'
+    "</div>"
+    "</div>"
+)
+
+# Shown instead of a temperature missing from a forecast
+MISSING_TEMPERATURE = "&ndash;"
+
+# The same cells showing the images through the classes of an `AssetRegistry`,
+# so every image is embedded once in the document
+SQUARE_ASSETS = ["square_blue.svg", "square_light_blue.svg"]
+EMBEDDED_EMPTY_CELL = CellTemplate(
+    '<span class="square asset-square_light_blue" style="width: 85px;"></span>'
+)
+EMBEDDED_DAY_CELL = CellTemplate(
+    '<div style="position: relative;">'
+    '<span class="square asset-square_blue" style="width: 85px;"></span>'
+    '<span class="{icon}" style="position: absolute; top:25px; left:30px; width: 35px;"></span>'
+    '<div style="position: absolute; top: 0; left: 0; width: 100%; height: 100%; text-align: center; vertical-align: bottom; font-weight: bold;">'
+    '<span style="position: absolute; top: 10px; left: 0; width: 100%; height: 100%; text-align: center; font-size: 12px; font-weight: bold; color: #007DFE;">{day}</span>'
+    "</div>"
+    '<div style="position: absolute; top: 70px; left: 0; width: 100%; height: 100%; text-align: center; vertical-align: bottom; font-weight: bold;">'
+    '<span style="color: black; font-size:12px">{high}&deg; </span>'
+    '<span style="color: gray; font-size:8px">/{low}&deg;</span>'
+    "</div>"
+    "</div>"
+)
+
+
+def format_temperatures(values: pd.Series) -> np.ndarray:
+    """Show temperatures as whole degrees when they are, and missing ones as a dash
+
+    A forecast with a missing temperature is read as floats, which would show
+    every other temperature with a trailing ".0" and the missing ones as "nan"
+
+    Args:
+        values (Series): The temperatures
+
+    Returns:
+        ndarray: The text of every temperature
+    """
+    present = values.dropna()
+    if (present == present.round()).all():
+        values = values.astype("Int64")
+    return np.where(values.notna(), values.astype(str), MISSING_TEMPERATURE)
+
+
 def style_cell(x: float) -> str:
     """Style the cells in the table
 
@@ -211,37 +331,79 @@ def style_cell(x: float) -> str:
         str: The HTML code to style the cell
     """
     if np.isnan(x):
-        return '<img class="square" width=85px src="./images/square_light_blue.svg">'
+        return EMPTY_CELL.render(images=IMAGES)[0]
+    element = WEATHER.loc[int(x)]
+    return DAY_CELL.render(
+        images=IMAGES,
+        day=[int(x)],
+        icon=[element["icon"]],
+        high=[element["high"]],
+        low=[element["low"]],
+    )[0]
+
+
+@traced
+def style_grid(
+    df: pd.DataFrame,
+    weather: pd.DataFrame = WEATHER,
+    images: str = IMAGES,
+    assets: Optional[AssetRegistry] = None,
+) -> pd.DataFrame:
+    """Style all the cells of the calendar at once
+
+    Gives the same result as `df.applymap(style_cell)`, but the padding cells
+    are found with a single `np.isnan` over the whole grid and the records of
+    all the days are looked up together
+
+    Args:
+        df (DataFrame): The calendar, with the day of the month in every cell
+            and NaN in the padding cells
+        weather (DataFrame): The weather records indexed by day
+        images (str): The directory of the icons, relative to the HTML file
+        assets (AssetRegistry): Embed the squares and icons once through this
+            registry instead of linking them in every cell
+
+    Returns:
+        DataFrame: The HTML code of every cell
+    """
+    days = df.to_numpy(dtype=float).ravel()
+    filled = ~np.isnan(days)
+    records = weather.loc[days[filled].astype(int)]
+    if assets is None:
+        cells = EMPTY_CELL.render(days.size, images=images)
+        day_cell, icons = DAY_CELL, records["icon"]
     else:
-        element = [e for e in DATA if e["day"] == x][0]
-        icon = element["icon"]
-        min = element["low"]
-        max = element["high"]
-        return (
-            '<div style="position: relative;">'
-            '<img class="square" width=85px src="./images/square_blue.svg"/>'
-            f'<img style="position: absolute; top:25px; left:30px;" width=35px src="./images/{icon}.svg"/>'
-            '<div style="position: absolute; top: 0; left: 0; width: 100%; height: 100%; text-align: center; vertical-align: bottom; font-weight: bold;">'
-            f'<span style="position: absolute; top: 10px; left: 0; width: 100%; height: 100%; text-align: center; font-size: 12px; font-weight: bold; color: #007DFE;">{int(x)}</span>'
-            "</div>"
-            '<div style="position: absolute; top: 70px; left: 0; width: 100%; height: 100%; text-align: center; vertical-align: bottom; font-weight: bold;">'
-            f'<span style="color: black; font-size:12px">{max}&deg; </span>'
-            f'<span style="color: gray; font-size:8px">/{min}&deg;</span>'
-            "</div>"
-            "</div>"
-        )
+        for name in SQUARE_ASSETS:
+            assets.use(name)
+        classes = {icon: assets.use(f"{icon}.svg") for icon in records["icon"].unique()}
+        cells = EMBEDDED_EMPTY_CELL.render(days.size)
+        day_cell, icons = EMBEDDED_DAY_CELL, records["icon"].map(classes)
+    cells[filled] = day_cell.render(
+        images=images,
+        day=records.index,
+        icon=icons,
+        high=format_temperatures(records["high"]),
+        low=format_temperatures(records["low"]),
+    )
+    return pd.DataFrame(cells.reshape(df.shape), index=df.index, columns=df.columns)
 
 
-def style_table(df: pd.DataFrame) -> pd.DataFrame:
+@traced
+def style_table(
+    df: pd.DataFrame, assets: Optional[AssetRegistry] = None
+) -> pd.DataFrame:
     """Style the table
 
     Args:
         df (DataFrame): The dataframe to style
+        assets (AssetRegistry): Embed the images through this registry
 
     Returns:
         DataFrame: The styled dataframe
     """
-    df_result = df.applymap(style_cell)
+    from pandas.io.formats.style import Styler
+
+    df_result = style_grid(df, assets=assets)
     MyStyler = Styler.from_custom_template(
         searchpath="", html_table="html_template.tpl"
     )
@@ -250,47 +412,198 @@ def style_table(df: pd.DataFrame) -> pd.DataFrame:
         styler.format()
         .hide()
         .set_table_styles(CUSTOM_STYLE)
-        .set_caption(  # This would probably be better if added to the template
-            (
-                '<div style="padding-top: 20px; display: flex; justify-content:space-between">'
-                '<div style="order: 1">'
-                '<span style="text-align:left; display: inline; color: #787878;'
-                'font-size: 12px;"> Source: <strong>AccuWeather</strong> | #30DayChartChallenge'
-                " | Day 2</span></div>"
-                '<div style="order:2">'
-                '<img style="margin-bottom:-2px; display:inline" '
-                'src="images/twitter.svg" width=12/>'
-                '<span style="color: #787878; font-size:12px; text-align:right">'
-                " @masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
-                '<img style="margin-bottom:-2px; display:inline" '
-                'src="images/github.svg" width=12/>'
-                '<span style="color: #787878; font-size:12px; text-align:right">'
-                " ilko-masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
-                '<img style="margin-bottom:-2px; display:inline" '
-                'src="images/linkedin.svg" width=12/>'
-                '<span style="color: #787878; font-size:12px; text-align:right">'
-                " masaldzhiyski</span></div></div>"
-            )
-        )
-        .set_table_attributes(
-            'style="border-spacing: 0px; margin-left: auto; margin-right: auto;"'
-        )
+        .set_caption(CAPTION)
+        .set_table_attributes(TABLE_ATTRIBUTES)
     )
     return df_result
 
 
-def main():
-    """Main function"""
-    df = pd.DataFrame(DATA)
-    df_pivot = df.pivot(index="week_index", columns="dow", values="day").reset_index(
-        drop=True
+@traced
+def write_table(
+    df: pd.DataFrame, f: TextIO, assets: Optional[AssetRegistry] = None
+) -> None:
+    """Write the styled table without going through Styler
+
+    Produces the same table as `style_table`, writing the rows straight to `f`
+
+    Args:
+        df (DataFrame): The dataframe to write
+        f (TextIO): The file the HTML is written to
+        assets (AssetRegistry): Embed the images through this registry, their
+            styles are written before the table
+    """
+    table = HtmlTable(
+        CUSTOM_STYLE,
+        caption=CAPTION,
+        table_attributes=TABLE_ATTRIBUTES,
+        template="html_template.tpl",
+    )
+    df_styled = style_grid(df, assets=assets)
+    # The images used are only known once the cells are styled
+    f.write(assets.style() if assets else "")
+    table.write(df_styled, f)
+
+
+def add_calendar_fields(forecast: pd.DataFrame) -> pd.DataFrame:
+    """Derive the calendar position of every date in a forecast
+
+    Adds the month, the day of the month, the day of the week and the week of
+    the month (starting at 1 on Monday), the fields entered by hand in `DATA`
+
+    Args:
+        forecast (DataFrame): The forecast with a date column
+
+    Returns:
+        DataFrame: The forecast with the month, day, dow and week_index columns
+    """
+    dates = pd.to_datetime(forecast["date"])
+    day = dates.dt.day
+    # The day of the week of the first day of the month, Monday being 0
+    first_weekday = (dates.dt.weekday - (day - 1)) % 7
+    return forecast.assign(
+        month=dates.dt.to_period("M"),
+        day=day,
+        dow=dates.dt.day_name().str[:3],
+        week_index=(day - 1 + first_weekday) // 7 + 1,
     )
-    df_pivot = df_pivot[["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]]
-    df_result = style_table(df_pivot)
-    html = HTML(df_result.to_html())  # We can use Jinja2 if needed to render the HTML
-    with open("result.html", "w") as f:
-        f.write(html.data)
+
+
+@traced
+def calendar_grid(df: pd.DataFrame) -> pd.DataFrame:
+    """Lay out the days of a month as a calendar
+
+    Args:
+        df (DataFrame): The days of the month with their dow and week_index
+
+    Returns:
+        DataFrame: One row per week and one column per day of the week, with
+            NaN in the padding cells
+    """
+    df_pivot = df.pivot(index="week_index", columns="dow", values="day")
+    return df_pivot.reindex(columns=DAYS).reset_index(drop=True)
+
+
+@traced
+def render_calendars(
+    forecast: pd.DataFrame, output_dir: str = "calendars", embed_assets: bool = False
+) -> Dict[str, float]:
+    """Write a calendar for every city and month of a forecast
+
+    Every calendar is written by the same `HtmlTable`, so the template is
+    read only once, and they all link the icons in `images/`
+
+    Args:
+        forecast (DataFrame): The forecast, with the columns in FORECAST_COLUMNS
+        output_dir (str): The directory the calendars are written to
+        embed_assets (bool): Embed the squares and icons in every calendar
+            instead of linking them. They are still read only once
+
+    Returns:
+        Dict[str, float]: The seconds spent on every calendar, by file name
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    images = os.path.relpath(IMAGES, output_dir)
+    # The caption links the social icons from images/ as well
+    caption = CAPTION.replace('src="images/', f'src="{images}/')
+    table = HtmlTable(
+        CUSTOM_STYLE,
+        table_attributes=TABLE_ATTRIBUTES,
+        template="html_template.tpl",
+    )
+    df = add_calendar_fields(forecast)
+    timings = {}
+    for (city, month), df_month in df.groupby(["city", "month"]):
+        start = time.perf_counter()
+        name = f"{city.lower().replace(' ', '-')}-{month}.html"
+        table.caption = (
+            CALENDAR_TITLE.format(city=city, month=month.strftime("%B %Y")) + caption
+        )
+        weather = df_month.set_index("day")
+        assets = AssetRegistry(IMAGES) if embed_assets else None
+        df_styled = style_grid(calendar_grid(df_month), weather, images, assets)
+        with open(os.path.join(output_dir, name), "w") as f:
+            f.write(assets.style() if assets else "")
+            table.write(df_styled, f)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def main(
+    writer: str = "styler",
+    output: str = "result.html",
+    forecast: Optional[str] = None,
+    output_dir: str = "calendars",
+    embed_assets: bool = False,
+):
+    """Main function
+
+    Args:
+        writer (str): Render the HTML with pandas "styler" or the "lean" writer
+        output (str): The file the HTML is written to, "-" for stdout
+        forecast (str): A CSV forecast of many cities and months. When given,
+            a calendar is written to output_dir for each of them instead
+        output_dir (str): The directory of the calendars in batch mode
+        embed_assets (bool): Embed the images once in the HTML instead of
+            linking them in every cell
+    """
+    if forecast is not None:
+        # A file of the user, no Feather conversion is written next to it
+        df_forecast = load_table(forecast, columns=FORECAST_COLUMNS, convert=False)
+        timings = render_calendars(df_forecast, output_dir, embed_assets)
+        for name, seconds in timings.items():
+            logging.info("Rendered %s in %.1f ms", name, seconds * 1000)
+        logging.info(
+            "Rendered %d calendars in %.2f s", len(timings), sum(timings.values())
+        )
+        return
+    df_pivot = calendar_grid(pd.DataFrame(DATA))
+    assets = AssetRegistry(IMAGES) if embed_assets else None
+    if writer == "lean":
+        with open_output(output) as f:
+            write_table(df_pivot, f, assets)
+        return
+    df_result = style_table(df_pivot, assets)
+    with stage("to_html") as current:
+        current.result = df_result.to_html()
+    with open_output(output) as f:
+        f.write(assets.style() if assets else "")
+        f.write(current.result)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Monthly weather forecast")
+    parser.add_argument(
+        "--writer",
+        choices=("styler", "lean"),
+        default="styler",
+        help="Render the HTML with pandas Styler or the lean table writer",
+    )
+    parser.add_argument(
+        "--output",
+        default="result.html",
+        help='The file the HTML is written to, "-" for stdout',
+    )
+    parser.add_argument(
+        "--forecast",
+        default=None,
+        help="CSV with the city, date, icon, low and high of many forecasts",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="calendars",
+        help="The directory the calendars of --forecast are written to",
+    )
+    parser.add_argument(
+        "--embed-assets",
+        action="store_true",
+        help="Embed the images once in the HTML instead of linking them",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(
+        writer=args.writer,
+        output=args.output,
+        forecast=args.forecast,
+        output_dir=args.output_dir,
+        embed_assets=args.embed_assets,
+    )
@@ -1,7 +1,17 @@
+import argparse
+import sys
+from pathlib import Path
+from typing import Sequence
+
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from pretty_python.export import RESOLUTIONS, export_figure  # noqa: E402
+from pretty_python.tracing import stage, traced  # noqa: E402
+
 # https://www.fao.org/forest-resources-assessment/2020/en/
 DATA = [
     {"period": "1990-2000", "deforestation": -16, "expansion": 8},
@@ -11,18 +21,28 @@ DATA = [
 ]
 
 
-def main():
-    """Main function."""
+def main(sizes: Sequence[str] = ("print",)):
+    """Main function.
+
+    Args:
+        sizes (Sequence[str]): The sizes of the chart to write.
+    """
     df = pd.DataFrame(DATA)
     df_melt = df.melt(id_vars="period")
-    style_plot(df_melt)
+    fig = style_plot(df_melt)
+    with stage("savefig", output="./images/fauna.png"):
+        export_figure(fig, "./images/fauna.png", sizes, transparent=True)
 
 
-def style_plot(df_melt: pd.DataFrame) -> None:
+@traced
+def style_plot(df_melt: pd.DataFrame):
     """Style the plot.
 
     Args:
         df_melt (pd.DataFrame): Melted dataframe.
+
+    Returns:
+        matplotlib.figure.Figure: The chart, ready to be saved.
     """
     fig, ax = plt.subplots(figsize=(10, 3))
     sns.barplot(
@@ -57,8 +77,17 @@ def style_plot(df_melt: pd.DataFrame) -> None:
     ax.axvline(x=0, ymin=0, ymax=1, color="#333333", linewidth=2)
     fig.set_facecolor("#E1DFD0")
     ax.set_facecolor("#E1DFD0")
-    plt.savefig("./images/fauna.png", dpi=300, bbox_inches="tight", transparent=True)
+    return fig
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Forest expansion and deforestation")
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        choices=RESOLUTIONS,
+        default=["print"],
+        help="The sizes of the chart to write, from one draw",
+    )
+    args = parser.parse_args()
+    main(sizes=args.sizes)
@@ -1,7 +1,18 @@
+import argparse
+import sys
+from pathlib import Path
+from typing import Sequence
+
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+from matplotlib.offsetbox import AnnotationBbox
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from pretty_python.export import RESOLUTIONS, export_figure  # noqa: E402
+from pretty_python.images import offset_image  # noqa: E402
+from pretty_python.tracing import stage, traced  # noqa: E402
 
 # Scraped from https://www.statista.com/statistics/564769/airline-industry-number-of-flights/
 DATA = [
@@ -19,6 +30,7 @@ DATA = [
 ]
 
 
+@traced
 def annotate_graph(ax):
     """Annotate the graph.
 
@@ -77,6 +89,7 @@ def annotate_graph(ax):
     )
 
 
+@traced
 def style_plot(fig, ax, df):
     """Style the plot.
 
@@ -102,29 +115,63 @@ def style_plot(fig, ax, df):
     ax.xaxis.set_tick_params(pad=10)
 
 
-def add_image(ax):
+@traced
+def add_image(ax, dpi: float = 300):
     """Add image to plot.
 
+    The image is decoded and scaled to the pixels it covers only once, see
+    `offset_image`. It's scaled for the largest of the sizes saved, the
+    smaller ones are downsampled from that draw like the rest of the chart.
+
     Args:
         ax (matplotlib.axes.Axes): Axes object.
+        dpi (float): The largest resolution the chart is saved at.
     """
-    img = plt.imread("./images/coronavirus.png")
-    imagebox = OffsetImage(img, zoom=0.08)
+    imagebox = offset_image("./images/coronavirus.png", zoom=0.08, dpi=dpi)
     ab = AnnotationBbox(imagebox, (2020.45, 24), frameon=False)
     ax.add_artist(ab)
 
 
-def main():
-    """Main function."""
-    df = pd.DataFrame(DATA)
-    fig, ax = plt.subplots(figsize=(10, 10))
-    sns.lineplot(data=df, x="year", y="flights", color="tab:red", linewidth=2)
-    plt.fill_between(df["year"], df["flights"], alpha=0.3, color="salmon")
+def plot_chart(df: pd.DataFrame, dpi: float = 300):
+    """Draw the whole chart, ready to be saved.
+
+    Args:
+        df (pd.DataFrame): The flights of every year.
+        dpi (float): The resolution the chart is saved at, see `add_image`.
+
+    Returns:
+        matplotlib.figure.Figure: The chart.
+    """
+    with stage("plot_flights"):
+        fig, ax = plt.subplots(figsize=(10, 10))
+        sns.lineplot(data=df, x="year", y="flights", color="tab:red", linewidth=2)
+        plt.fill_between(df["year"], df["flights"], alpha=0.3, color="salmon")
     style_plot(fig, ax, df)
     annotate_graph(ax)
-    add_image(ax)
-    plt.savefig("./images/historical.png", dpi=300, bbox_inches="tight")
+    add_image(ax, dpi)
+    return fig
+
+
+def main(sizes: Sequence[str] = ("print",)):
+    """Main function.
+
+    Args:
+        sizes (Sequence[str]): The sizes of the chart to write.
+    """
+    df = pd.DataFrame(DATA)
+    fig = plot_chart(df, max(RESOLUTIONS[size] for size in sizes))
+    with stage("savefig", output="./images/historical.png"):
+        export_figure(fig, "./images/historical.png", sizes)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Number of flights per year")
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        choices=RESOLUTIONS,
+        default=["print"],
+        help="The sizes of the chart to write, from one draw",
+    )
+    args = parser.parse_args()
+    main(sizes=args.sizes)
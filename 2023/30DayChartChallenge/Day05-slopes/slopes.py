@@ -1,24 +1,123 @@
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Optional, Sequence
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 import seaborn as sns
 import matplotlib.pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap, LogNorm
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
-def style_plot(ax):
-    """Style the plot.
+from pretty_python.loaders import load_table  # noqa: E402
+from pretty_python.export import RESOLUTIONS, export_figure  # noqa: E402
+from pretty_python.tracing import stage, traced  # noqa: E402
+from pretty_python.trend import check_trend, update_trend  # noqa: E402
+
+# The transfers shipped with the chart
+DATA_FILE = "transfer_records.csv"
+
+# The chart of DATA_FILE
+OUTPUT = "./images/slopes.png"
+
+# The ways of drawing the transfers as one layer of counts instead of markers
+DENSITY_KINDS = ("hexbin", "hist2d")
+
+# From the background of the chart to the red of the markers
+DENSITY_CMAP = LinearSegmentedColormap.from_list("transfers", ["#E1DFD0", "#E3120B"])
+
+# The bins of the value axis, the year axis gets one bin per year
+VALUE_BINS = 60
+
+# The largest transfers, drawn as markers over the density, like the
+# annotated Neymar, Pogba and Ronaldo
+OUTLIERS = 4
+
+# The trend is a cubic fitted to the transfers, drawn through this many points
+TREND_DEGREE = 3
+TREND_POINTS = 50
+
+
+@traced
+def plot_markers(df: pd.DataFrame, size_norm: Optional[tuple] = None):
+    """Draw every transfer as a marker sized by its value.
+
+    Args:
+        df (pd.DataFrame): The transfers, with year and value_gbp.
+        size_norm (tuple): The values of the smallest and largest markers, the
+            range of df if None.
+    """
+    sns.scatterplot(
+        data=df,
+        x="year",
+        y="value_gbp",
+        size="value_gbp",
+        sizes=(10, 300),
+        size_norm=size_norm,
+        legend=False,
+        linewidth=0,
+        color="#E3120B",
+    )
+
+
+@traced
+def plot_density(
+    ax, df: pd.DataFrame, kind: str = "hexbin", outliers: int = OUTLIERS
+):
+    """Draw the number of transfers per year and value as one raster layer.
+
+    Drawing millions of markers is what makes the chart slow, the counts are
+    binned with NumPy and drawn as a single image instead. Only the largest
+    transfers keep a marker, sized as in the chart of every transfer.
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes object.
+        df (pd.DataFrame): The transfers, with year and value_gbp.
+        kind (str): "hexbin" for hexagonal bins, "hist2d" for rectangular ones.
+        outliers (int): The number of largest transfers drawn as markers.
+    """
+    year = df["year"].to_numpy()
+    value = df["value_gbp"].to_numpy()
+    year_bins = np.arange(year.min(), year.max() + 2) - 0.5
+    value_bins = np.linspace(0, value.max(), VALUE_BINS + 1)
+    if kind == "hexbin":
+        ax.hexbin(
+            year,
+            value,
+            gridsize=(len(year_bins) - 1, VALUE_BINS // 2),
+            extent=(year_bins[0], year_bins[-1], 0, value.max()),
+            bins="log",
+            mincnt=1,
+            cmap=DENSITY_CMAP,
+            linewidths=0,
+            rasterized=True,
+        )
+    else:
+        counts, _, _ = np.histogram2d(year, value, bins=(year_bins, value_bins))
+        ax.imshow(
+            np.ma.masked_equal(counts.T, 0),
+            extent=(year_bins[0], year_bins[-1], 0, value.max()),
+            origin="lower",
+            aspect="auto",
+            interpolation="nearest",
+            cmap=DENSITY_CMAP,
+            norm=LogNorm(vmin=1),
+        )
+    plot_markers(df.nlargest(outliers, "value_gbp"), (value.min(), value.max()))
+
+
+def annotate_players(ax):
+    """Point out the record transfers of DATA_FILE.
 
     Args:
         ax (matplotlib.axes.Axes): Axes object.
     """
-    plt.gca().yaxis.set_major_formatter(mticker.StrMethodFormatter("£{x:,.0f}"))
-    ax.set(xlabel="", ylabel="", xlim=(1980, 2020))
-    sns.despine(left=True, top=True, right=True, bottom=False)
-    ax.yaxis.tick_right()
-    # add grid lines to the plot for the y axis
-    ax.yaxis.grid(True, color="slategray", alpha=0.1)
-    # add annotation to most-expensive player
     ax.annotate(
         "Neymar",
         xy=(2016.7, 196000000),
@@ -49,6 +148,25 @@ def style_plot(ax):
         color="black",
         fontsize=10,
     )
+
+
+@traced
+def style_plot(ax, players: bool = True):
+    """Style the plot.
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes object.
+        players (bool): Point out the record transfers of DATA_FILE.
+    """
+    plt.gca().yaxis.set_major_formatter(mticker.StrMethodFormatter("£{x:,.0f}"))
+    ax.set(xlabel="", ylabel="", xlim=(1980, 2020))
+    sns.despine(left=True, top=True, right=True, bottom=False)
+    ax.yaxis.tick_right()
+    # add grid lines to the plot for the y axis
+    ax.yaxis.grid(True, color="slategray", alpha=0.1)
+    # add annotation to most-expensive player
+    if players:
+        annotate_players(ax)
     ax.set_yticks([5000000, 50000000, 100000000, 150000000, 200000000], minor=False)
     ax.set_xticks([1980, 1990, 2000, 2010, 2020], minor=False)
     ax.set_xticklabels([], minor=False)
@@ -57,6 +175,7 @@ def style_plot(ax):
     ax.set_facecolor("#E1DFD0")
 
 
+@traced
 def annotate_plot(ax):
     """Annotate the graph.
 
@@ -132,39 +251,144 @@ def annotate_plot(ax):
     )
 
 
-def main():
-    """Main function."""
+def plot_chart(
+    df: pd.DataFrame,
+    trend_key: str,
+    density: Optional[str] = None,
+    outliers: int = OUTLIERS,
+    check: bool = False,
+    players: bool = True,
+):
+    """Draw the whole chart, ready to be saved.
+
+    Args:
+        df (pd.DataFrame): The transfers, with year and value_gbp.
+        trend_key (str): The name the sums of the trend are kept under, see
+            `update_trend`.
+        density (str): Draw the transfers as bins of this kind, see
+            DENSITY_KINDS, instead of a marker per transfer.
+        outliers (int): The number of largest transfers still drawn as
+            markers in density mode.
+        check (bool): Compare the trend, kept up to date with the transfers
+            appended since the previous run, with a refit over all of them,
+            and log the difference. Transfers edited before the last block
+            counted are also picked up, see `update_trend`.
+        players (bool): Point out the record transfers of DATA_FILE.
+
+    Returns:
+        matplotlib.figure.Figure: The chart.
+    """
+    with stage("plot_transfers"):
+        fig, ax = plt.subplots(figsize=(10, 6))
+        fig.set_facecolor("#E1DFD0")
+        if density is None:
+            plot_markers(df)
+        else:
+            plot_density(ax, df, density, outliers)
+    with stage("plot_trend"):
+        year, value = df["year"].to_numpy(), df["value_gbp"].to_numpy()
+        # Only the transfers appended since the previous run are added to the fit
+        trend = update_trend(year, value, TREND_DEGREE, key=trend_key, verify=check)
+        if check:
+            # A mismatch is reported, the chart is still exported
+            try:
+                difference = check_trend(trend, year, value)
+                logging.info("Trend matches a refit within %.2g", difference)
+            except ValueError as error:
+                logging.warning("%s", error)
+        grid = np.linspace(year.min(), year.max(), TREND_POINTS)
+        ax.plot(grid, trend(grid), linestyle="--", alpha=1, color="black")
+    style_plot(ax, players)
+    annotate_plot(ax)
+    return fig
+
+
+def main(
+    sizes: Sequence[str] = ("print",),
+    data: str = DATA_FILE,
+    density: Optional[str] = None,
+    outliers: int = OUTLIERS,
+    check: bool = False,
+    output: Optional[str] = None,
+):
+    """Main function.
+
+    Args:
+        sizes (Sequence[str]): The sizes of the chart to write.
+        data (str): The CSV, Parquet or Feather file of the transfers, with
+            year and value_gbp.
+        density (str): Draw the transfers as bins of this kind, see
+            DENSITY_KINDS, instead of a marker per transfer.
+        outliers (int): The number of largest transfers still drawn as
+            markers in density mode.
+        check (bool): Compare the trend with a refit over all transfers.
+        output (str): The PNG file of the print size, needed unless data is
+            DATA_FILE, whose chart is OUTPUT.
+    """
+    if output is None:
+        if data != DATA_FILE:
+            raise ValueError(f"An output file is needed for the chart of {data}")
+        output = OUTPUT
     # Data scraped from Wikipedia
     # https://en.wikipedia.org/wiki/List_of_most_expensive_association_football_transfers
 
-    df = pd.read_csv("transfer_records.csv")
+    with stage("load_table"):
+        # Only the shipped CSV gets a Feather conversion, not files of the user
+        df = load_table(
+            data, columns=["year", "value_gbp"], convert=data == DATA_FILE
+        )
     df = df[df["year"] >= 1980]
-    fig, ax = plt.subplots(figsize=(10, 6))
-    fig.set_facecolor("#E1DFD0")
-    sns.scatterplot(
-        data=df,
-        x="year",
-        y="value_gbp",
-        size="value_gbp",
-        sizes=(10, 300),
-        legend=False,
-        linewidth=0,
-        color="#E3120B",
+    # The players pointed out are those of the shipped transfers
+    fig = plot_chart(
+        df, os.path.abspath(data), density, outliers, check, data == DATA_FILE
     )
-    z = np.polyfit(df["year"], df["value_gbp"], 3)
-    p = np.poly1d(z)
-    sns.lineplot(
-        data=df,
-        x="year",
-        y=p(df["year"]),
-        linestyle="--",
-        alpha=1,
-        color="black",
-    )
-    style_plot(ax)
-    annotate_plot(ax)
-    plt.savefig("./images/slopes.png", dpi=300, bbox_inches="tight")
+    with stage("savefig", output=output):
+        export_figure(fig, output, sizes)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Breaking football transfer records")
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        choices=RESOLUTIONS,
+        default=["print"],
+        help="The sizes of the chart to write, from one draw",
+    )
+    parser.add_argument(
+        "--data",
+        default=DATA_FILE,
+        help="The CSV, Parquet or Feather file of the transfers",
+    )
+    parser.add_argument(
+        "--output",
+        help=f"The PNG file of the chart, {OUTPUT} for the shipped transfers",
+    )
+    parser.add_argument(
+        "--density",
+        choices=DENSITY_KINDS,
+        help="Bin the transfers into one layer, for millions of rows",
+    )
+    parser.add_argument(
+        "--outliers",
+        type=int,
+        default=OUTLIERS,
+        help="The number of largest transfers drawn as markers in density mode",
+    )
+    parser.add_argument(
+        "--check-trend",
+        action="store_true",
+        help="Compare the trend with a refit over all transfers",
+    )
+    args = parser.parse_args()
+    if args.data != DATA_FILE and args.output is None:
+        parser.error("--output is required with --data")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(
+        sizes=args.sizes,
+        data=args.data,
+        density=args.density,
+        outliers=args.outliers,
+        check=args.check_trend,
+        output=args.output,
+    )
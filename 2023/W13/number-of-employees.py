@@ -1,10 +1,49 @@
-import matplotlib.pyplot as plt
+import argparse
+import base64
+import logging
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, Optional, TextIO
+
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from IPython.display import HTML
-from pandas.io.formats.style import Styler
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pretty_python.assets import AssetRegistry  # noqa: E402
+from pretty_python.html_table import HtmlTable, open_output  # noqa: E402
+from pretty_python.loaders import load_table  # noqa: E402
+from pretty_python.tracing import stage, traced  # noqa: E402
+from sparklines import (  # noqa: E402
+    RENDERERS,
+    BaseSparklineRenderer,
+    SparklineCache,
+    SparklineRenderer,
+    render_sparklines,
+)
+
+
+# How sparklines end up in the TREND column: linked SVG files, inline <svg>
+# elements or data URIs
+EMBED_MODES = ("file", "inline", "data-uri")
+
+# The columns of data.csv used by the table
+CSV_COLUMNS = ["Year", "Number", "Ticker", "Company"]
+
+# Explicit dtypes used when reading data.csv in chunks
+CSV_DTYPES = {
+    "Year": "int16",
+    "Number": "int64",
+    "Ticker": "category",
+    "Company": "category",
+}
+
+# The icons of a positive, a negative and no change in `add_delta_column`
+DELTA_ICONS = ("arrow-up-solid.svg", "arrow-down-solid.svg", "minus-solid.svg")
+
+# The first year of every window we calculate a delta for (1Y, 3Y and 10Y)
+DELTA_WINDOWS = (2021, 2019, 2012)
 
 CUSTOM_STYLE = [
     # Table column headers
@@ -53,6 +92,116 @@ CUSTOM_STYLE = [
 ]
 
 
+# The properties of the cells, in the order they are applied to the columns.
+# A subset of None applies the properties to every column
+COLUMN_PROPERTIES = [
+    (
+        ["1Y", "3Y", "10Y"],
+        {
+            "border-left": "2.5px solid #f2f2f2 !important",
+            "border-right": "1px solid white !important",
+            "padding-left": "10px !important",
+            "padding-right": "10px !important",
+        },
+    ),
+    (
+        ["COMPANY"],
+        {
+            "border-left": "0px !important",
+            "border-right": "0px !important",
+        },
+    ),
+    (
+        ["# EMPLOYEES"],
+        {
+            "border-left": "0px !important",
+            "border-right": "0px !important",
+            "text-align": "center !important",
+            "font-weight": "bold",
+        },
+    ),
+    (
+        ["TREND"],
+        {"border-left": "0px !important", "text-align": "center !important"},
+    ),
+    (None, {"font-family": "Archivo", "font-size": "14px"}),
+]
+
+# The styles of the column headers
+HEADER_STYLES = [
+    lambda x: np.where(
+        x.isin(["1Y", "3Y", "10Y", "TREND"]),
+        "text-align: center",
+        "text-align: left",
+    ),
+    lambda x: np.where(x == "3Y", "color: blue !important", "color:black"),
+]
+
+# Table caption, shown as a footer
+CAPTION = (
+    '<div style="display: flex; justify-content:space-between">'
+    '<div style="order: 1">'
+    '<span style="text-align:left; display: inline; color: #787878;'
+    'font-size: 12px;"> Source: <strong>macrotrends.net</strong> | '
+    "Number of employees in tech</span> </div>"
+    '<div style="order:2">'
+    '<img style="margin-bottom:-2px; display:inline" '
+    'src="images/twitter.svg" width=12/>'
+    '<span style="color: #787878; font-size:12px; text-align:right">'
+    " @masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
+    '<img style="margin-bottom:-2px; display:inline" '
+    'src="images/github.svg" width=12/>'
+    '<span style="color: #787878; font-size:12px; text-align:right">'
+    " ilko-masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
+    '<img style="margin-bottom:-2px; display:inline" '
+    'src="images/linkedin.svg" width=12/>'
+    '<span style="color: #787878; font-size:12px; text-align:right">'
+    " masaldzhiyski</span></div></div>"
+)
+
+TABLE_ATTRIBUTES = 'style="border-spacing: 0px;"'
+
+
+@traced
+def read_employees(
+    path: str = "./data.csv", chunksize: Optional[int] = None
+) -> pd.DataFrame:
+    """Read the number of employees of every ticker
+
+    By default the whole file is read at once through `load_table`, which
+    reads only the columns we use and reuses the Feather conversion of the
+    CSV when there is one. With a chunk size, the CSV is streamed in chunks
+    with explicit dtypes and category-typed Ticker and Company columns. Only
+    the first number for every (Ticker, Year) pair is kept between chunks,
+    so the memory used is bounded by the number of tickers and years rather
+    than by the size of the file. Both reads keep the first number of a
+    duplicated pair, like `compute_deltas`. Both the deltas and the
+    sparklines are calculated from this series afterwards
+
+    Args:
+        path: The file with the Year, Number, Ticker and Company columns. Only
+            CSV files can be read in chunks
+        chunksize: The number of rows read at once, None to read everything
+
+    Returns:
+        The series of every ticker
+    """
+    if chunksize is None:
+        df = load_table(path, columns=CSV_COLUMNS, thousands=",")
+        return df.drop_duplicates(subset=["Ticker", "Year"], keep="first")
+    df = None
+    for chunk in pd.read_csv(
+        path, usecols=CSV_COLUMNS, thousands=",", dtype=CSV_DTYPES, chunksize=chunksize
+    ):
+        if df is not None:
+            chunk = pd.concat([df, chunk], ignore_index=True)
+        df = chunk.drop_duplicates(subset=["Ticker", "Year"], keep="first").astype(
+            {"Ticker": "category", "Company": "category"}
+        )
+    return df.reset_index(drop=True)
+
+
+@traced
 def plot_sparklines(df: pd.DataFrame, ticker: str) -> None:
     """Plot each individual sparkline and store it for later use
 
@@ -67,6 +216,10 @@ def plot_sparklines(df: pd.DataFrame, ticker: str) -> None:
         df: The data we'll be plotting
         ticker: The ticker of the company used in the file name when saving
     """
+    # The plotting stack is only loaded when a plot is drawn
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     fig, ax = plt.subplots(figsize=(5, 1))
     df.sort_values(by="Year", inplace=True)
     sns.lineplot(data=df, x="Year", y="Number", color="black")
@@ -95,9 +248,37 @@ def plot_sparklines(df: pd.DataFrame, ticker: str) -> None:
         bbox_inches="tight",
         transparent=True,
     )
+    plt.close(fig)
+
 
+def delta_icon(icon: str, assets: Optional[AssetRegistry] = None) -> str:
+    """Build the HTML of the icon showing the direction of a delta
 
-def add_delta_column(count_first_year: int, count_last_year: int) -> str:
+    Args:
+        icon: The file name of the icon in `images/`
+        assets: Embed the icon once in the document through this registry
+            instead of linking the file in every cell
+
+    Returns:
+        An HTML formatted string showing the icon
+    """
+    if assets is None:
+        return (
+            f'<img src="images/{icon}" width="10" '
+            'style="display:inline; margin-left: 5px; margin-right:'
+            '5px; padding-bottom: 2px;"/>'
+        )
+    return (
+        f'<span class="{assets.use(icon)}" style="width: 10px; margin-left: 5px; '
+        'margin-right:5px; padding-bottom: 2px;"></span>'
+    )
+
+
+def add_delta_column(
+    count_first_year: int,
+    count_last_year: int,
+    assets: Optional[AssetRegistry] = None,
+) -> str:
     """Add a column indicating the direction of the change and its value
 
     We'll be showing a green arrow pointing upwards if the direction is positive
@@ -110,6 +291,7 @@ def add_delta_column(count_first_year: int, count_last_year: int) -> str:
     Args:
         count_first_year: The value of the metric for the first year
         count_last_year: The value of the metric for the last year
+        assets: Embed the icons through this registry, see `delta_icon`
 
     Returns:
         An HTML formatted string including the image with the direction
@@ -120,31 +302,101 @@ def add_delta_column(count_first_year: int, count_last_year: int) -> str:
     elif count_last_year - count_first_year > 0:
         delta = (abs(count_first_year - count_last_year) / count_first_year) * 100
         delta = int(delta) if delta % 1 == 0 else round(delta, 1)
-        delta = (
-            '<span><img src="images/arrow-up-solid.svg" width="10" '
-            'style="display:inline; margin-left: 5px; margin-right:'
-            f'5px; padding-bottom: 2px;"/>{delta}%</span>'
-        )
+        delta = f"<span>{delta_icon(DELTA_ICONS[0], assets)}{delta}%</span>"
         return delta
     elif count_first_year - count_last_year > 0:
         delta = (abs(count_first_year - count_last_year) / count_first_year) * 100
         delta = int(delta) if delta % 1 == 0 else round(delta, 1)
-        delta = (
-            '<span><img src="images/arrow-down-solid.svg" width="10" '
-            'style="display:inline; margin-left: 5px; margin-right:'
-            f'5px; padding-bottom: 2px;"/>{delta}%</span>'
-        )
+        delta = f"<span>{delta_icon(DELTA_ICONS[1], assets)}{delta}%</span>"
         return delta
     else:
-        delta = (
-            '<span><img src="images/minus-solid.svg" width="10" '
-            'style="display:inline; margin-left: 5px; margin-right:'
-            '5px; padding-bottom: 2px;"/>0%</span>'
-        )
+        delta = f"<span>{delta_icon(DELTA_ICONS[2], assets)}0%</span>"
         return delta
 
 
-def produce_summary(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
+def company_cell(ticker: str, company: str) -> str:
+    """Build the HTML shown in the COMPANY column
+
+    Args:
+        ticker: The ticker of the company
+        company: The full name of the company
+
+    Returns:
+        An HTML formatted string with the logo, the name and the ticker
+    """
+    return (
+        '<div style="display:flex; align-items: center; justify-content: left">'
+        f'<div><img src="images/{ticker}.png" style="max-width: 40px"/></div>'
+        '<div style="padding-left:20px;">'
+        '<p style="text-align: left; margin-bottom:4px;">'
+        f"<strong>{company}</strong></p>"
+        '<p style="text-align: left; color: #A2A2A2; margin-top: 4px; '
+        f'margin-bottom:18px; font-size: 12px !important">SYMBL: {ticker}</p>'
+        "</div></div>"
+    )
+
+
+def inline_svg(svg: str, ticker: str, style: str) -> str:
+    """Turn the SVG document of a sparkline into an element of the table
+
+    matplotlib numbers the ids of every figure the same way (figure_1,
+    axes_1, ...) and adds a `<style>` applying to every element of the page.
+    The ids and their references are prefixed with the ticker, and the rules
+    of the style are moved to the root element, whose children inherit them
+
+    Args:
+        svg: The SVG document of the sparkline
+        ticker: The ticker of the company, unique in the table
+        style: The style of the root element
+
+    Returns:
+        The `<svg>` element, 150px wide
+    """
+    svg = svg[svg.index("<svg") :]
+    svg = re.sub(r"\s*<metadata>.*?</metadata>", "", svg, flags=re.S)
+    rules = re.findall(r"\*\s*\{([^}]*)\}", svg)
+    svg = re.sub(r"\s*<style[^>]*>.*?</style>", "", svg, flags=re.S)
+    svg = re.sub(r"\s*<defs>\s*</defs>", "", svg)
+    svg = re.sub(r'\b(id="|url\(#|href="#)', rf"\g<1>{ticker}-", svg)
+    style = "; ".join([style.rstrip("; ")] + [rule.strip() for rule in rules])
+    return re.sub(
+        r'width="[^"]*" height="[^"]*"', f'width="150" style="{style}"', svg, count=1
+    ).strip()
+
+
+def trend_cell(ticker: str, svg: Optional[str] = None, embed: str = "file") -> str:
+    """Build the HTML shown in the TREND column
+
+    By default the cell points to the sparkline stored in `graphs/`. The
+    sparkline can also be embedded in the cell, either as an inline `<svg>`
+    element, see `inline_svg`, or as a data URI
+
+    Args:
+        ticker: The ticker of the company
+        svg: The SVG document of the sparkline, needed unless embed is "file"
+        embed: One of "file", "inline" or "data-uri"
+
+    Returns:
+        An HTML formatted string showing the sparkline
+    """
+    style = "padding:0; margin:0; max-height: 60px;"
+    if embed == "inline":
+        return inline_svg(svg, ticker, style)
+    if embed == "data-uri":
+        data = base64.b64encode(svg.encode("utf-8")).decode("ascii")
+        return (
+            f'<img src="data:image/svg+xml;base64,{data}" width="150" '
+            f'style="{style}"/>'
+        )
+    return f'<img src="graphs/{ticker}.svg" width="150" style="{style}"/>'
+
+
+def produce_summary(
+    df: pd.DataFrame,
+    ticker: str,
+    renderer: Optional[BaseSparklineRenderer] = None,
+    embed: str = "file",
+) -> pd.DataFrame:
     """Generate a dataframe with the images and graphs we want to show
 
     The resulting dataframe will contain images and HTML code that needs to
@@ -153,6 +405,12 @@ def produce_summary(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
     Args:
         df: A group from the original dataframe filtered on the company ticker
         ticker: The name of the ticker that this df is filtered on
+        renderer: A batch renderer, either `SparklineRenderer` reusing the
+            same figure for every ticker or `SvgSparklineRenderer` writing
+            the SVG directly. A new figure is created for the sparkline when
+            it's not provided
+        embed: How the sparkline is shown, see `trend_cell`. Nothing is
+            written to `graphs/` unless it's "file"
 
     Returns:
         The calculated and graphed results for the given ticker
@@ -162,23 +420,22 @@ def produce_summary(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
     company = df["Company"].values[0]
     rows_list = []
     current_row = {}
-    current_row["COMPANY"] = (
-        '<div style="display:flex; align-items: center; justify-content: left">'
-        f'<div><img src="images/{ticker}.png" style="max-width: 40px"/></div>'
-        '<div style="padding-left:20px;">'
-        '<p style="text-align: left; margin-bottom:4px;">'
-        f"<strong>{company}</strong></p>"
-        '<p style="text-align: left; color: #A2A2A2; margin-top: 4px; '
-        f'margin-bottom:18px; font-size: 12px !important">SYMBL: {ticker}</p>'
-        "</div></div>"
-    )
+    current_row["COMPANY"] = company_cell(ticker, company)
     current_row["# EMPLOYEES"] = f"{count_last_year:,}"
-    current_row["TREND"] = (
-        f'<img src="graphs/{ticker}.svg" width="150" '
-        'style="padding:0; margin:0; max-height: 60px;"/>'
-    )
-    plot_sparklines(df, ticker)
-    for year in (2021, 2019, 2012):
+    if embed == "file":
+        current_row["TREND"] = trend_cell(ticker)
+        if renderer is None:
+            plot_sparklines(df, ticker)
+        else:
+            renderer.render(df, ticker)
+    elif renderer is None:
+        with SparklineRenderer(None) as renderer:
+            svg = renderer.to_svg(df, ticker)
+        current_row["TREND"] = trend_cell(ticker, svg, embed)
+    else:
+        svg = renderer.to_svg(df, ticker)
+        current_row["TREND"] = trend_cell(ticker, svg, embed)
+    for year in DELTA_WINDOWS:
         df_subset = df[df["Year"] >= year].copy()
         count_first_year = df_subset[df_subset["Year"] == df_subset["Year"].min()][
             "Number"
@@ -192,6 +449,129 @@ def produce_summary(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
     return pd.DataFrame(rows_list)
 
 
+def compute_deltas(
+    df: pd.DataFrame, assets: Optional[AssetRegistry] = None
+) -> pd.DataFrame:
+    """Calculate the employee count and the deltas of every ticker at once
+
+    Instead of filtering the data of every ticker for every window, we pivot
+    it into a Year x Ticker matrix once. The first year with data inside each
+    window and the last year with data are then found for all tickers with
+    array operations. A ticker without any data inside a window gets an
+    empty delta. When a year of a ticker has several rows, the first one is
+    used, as `read_employees` does
+
+    Args:
+        df: The original dataframe with the data of all tickers
+        assets: Embed the icons through this registry, see `delta_icon`
+
+    Returns:
+        The formatted count for the last year and the 1Y/3Y/10Y deltas,
+        indexed by ticker
+    """
+    df = df.drop_duplicates(subset=["Ticker", "Year"], keep="first")
+    matrix = df.pivot(index="Year", columns="Ticker", values="Number").sort_index()
+    years = matrix.index.to_numpy()
+    values = matrix.to_numpy(dtype=float)
+    present = ~np.isnan(values)
+    columns = np.arange(values.shape[1])
+
+    last_index = len(years) - 1 - present[::-1].argmax(axis=0)
+    count_last_year = values[last_index, columns].astype(np.int64)
+    df_deltas = pd.DataFrame(
+        {"# EMPLOYEES": [f"{count:,}" for count in count_last_year]},
+        index=matrix.columns,
+    )
+    for year in DELTA_WINDOWS:
+        in_window = present & (years >= year)[:, np.newaxis]
+        first_index = in_window.argmax(axis=0)
+        count_first_year = values[first_index, columns].astype(np.int64)
+        df_deltas[f"{2022-year}Y"] = [
+            add_delta_column(first, last, assets) if has_data else ""
+            for first, last, has_data in zip(
+                count_first_year, count_last_year, in_window.any(axis=0)
+            )
+        ]
+    return df_deltas
+
+
+@traced
+def produce_table(
+    df: pd.DataFrame,
+    svgs: Optional[Dict[str, str]] = None,
+    embed: str = "file",
+    assets: Optional[AssetRegistry] = None,
+) -> pd.DataFrame:
+    """Generate the summary table for all tickers at once
+
+    Produces the same table as applying `produce_summary` to every ticker
+    group, but the counts and deltas come from `compute_deltas`. The
+    sparklines themselves are rendered separately by `render_sparklines`
+
+    Args:
+        df: The original dataframe with the data of all tickers
+        svgs: The SVG of every ticker, needed unless embed is "file"
+        embed: How the sparklines are shown, see `trend_cell`
+        assets: Embed the icons through this registry, see `delta_icon`
+
+    Returns:
+        The calculated and graphed results for all tickers
+    """
+    df_deltas = compute_deltas(df, assets)
+    companies = df.groupby("Ticker")["Company"].first()
+    df_table = pd.DataFrame(
+        {
+            "COMPANY": [
+                company_cell(ticker, company) for ticker, company in companies.items()
+            ],
+            "# EMPLOYEES": df_deltas["# EMPLOYEES"].to_numpy(),
+            "TREND": [
+                trend_cell(ticker, (svgs or {}).get(ticker), embed)
+                for ticker in df_deltas.index
+            ],
+        }
+    )
+    for year in DELTA_WINDOWS:
+        df_table[f"{2022-year}Y"] = df_deltas[f"{2022-year}Y"].to_numpy()
+    return df_table
+
+
+def produce_table_chunks(
+    df: pd.DataFrame,
+    svgs: Optional[Dict[str, str]] = None,
+    embed: str = "file",
+    assets: Optional[AssetRegistry] = None,
+    chunksize: int = 100,
+) -> Iterator[pd.DataFrame]:
+    """Generate the summary table a few tickers at a time
+
+    The tickers are taken in the order `style_table` sorts the table in, so
+    writing the chunks one after the other gives the same table as sorting
+    the output of `produce_table`
+
+    Args:
+        df: The original dataframe with the data of all tickers
+        svgs: The SVG of every ticker, needed unless embed is "file"
+        embed: How the sparklines are shown, see `trend_cell`
+        assets: Embed the icons through this registry, see `delta_icon`
+        chunksize: The number of tickers in every chunk
+
+    Yields:
+        The rows of the summary table for the next `chunksize` tickers
+    """
+    positions = df.groupby("Ticker").indices
+    companies = df.groupby("Ticker")["Company"].first()
+    tickers = sorted(
+        positions, key=lambda ticker: company_cell(ticker, companies[ticker])
+    )
+    for start in range(0, len(tickers), chunksize):
+        chunk = tickers[start : start + chunksize]
+        rows = np.concatenate([positions[ticker] for ticker in chunk])
+        df_table = produce_table(df.iloc[rows], svgs, embed, assets)
+        yield df_table.sort_values(by="COMPANY")
+
+
+@traced
 def style_table(df: pd.DataFrame) -> pd.DataFrame:
     """Style the table
 
@@ -204,101 +584,179 @@ def style_table(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         The styled dataframe
     """
+    from pandas.io.formats.style import Styler
 
     MyStyler = Styler.from_custom_template(
         searchpath="", html_table="html_template.tpl"
     )
     styler = MyStyler(df.sort_values(by="COMPANY"))
-    df_result = (
-        styler.format()
-        .hide()
-        .set_table_styles(CUSTOM_STYLE)
-        .set_properties(
-            subset=["1Y", "3Y", "10Y"],
-            **{
-                "border-left": "2.5px solid #f2f2f2 !important",
-                "border-right": "1px solid white !important",
-                "padding-left": "10px !important",
-                "padding-right": "10px !important",
-            },
-        )
-        .set_properties(
-            subset=["COMPANY"],
-            **{
-                "border-left": "0px !important",
-                "border-right": "0px !important",
-            },
-        )
-        .set_properties(
-            subset=["# EMPLOYEES"],
-            **{
-                "border-left": "0px !important",
-                "border-right": "0px !important",
-                "text-align": "center !important",
-                "font-weight": "bold",
-            },
-        )
-        .set_properties(
-            subset=["TREND"],
-            **{"border-left": "0px !important", "text-align": "center !important"},
-        )
-        .set_caption(  # This would probably be better if added to the template
-            (
-                '<div style="display: flex; justify-content:space-between">'
-                '<div style="order: 1">'
-                '<span style="text-align:left; display: inline; color: #787878;'
-                'font-size: 12px;"> Source: <strong>macrotrends.net</strong> | '
-                "Number of employees in tech</span> </div>"
-                '<div style="order:2">'
-                '<img style="margin-bottom:-2px; display:inline" '
-                'src="images/twitter.svg" width=12/>'
-                '<span style="color: #787878; font-size:12px; text-align:right">'
-                " @masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
-                '<img style="margin-bottom:-2px; display:inline" '
-                'src="images/github.svg" width=12/>'
-                '<span style="color: #787878; font-size:12px; text-align:right">'
-                " ilko-masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
-                '<img style="margin-bottom:-2px; display:inline" '
-                'src="images/linkedin.svg" width=12/>'
-                '<span style="color: #787878; font-size:12px; text-align:right">'
-                " masaldzhiyski</span></div></div>"
-            )
-        )
-        .set_properties(**{"font-family": "Archivo", "font-size": "14px"})
-        .apply_index(
-            lambda x: np.where(
-                x.isin(["1Y", "3Y", "10Y", "TREND"]),
-                "text-align: center",
-                "text-align: left",
-            ),
-            axis=1,
-        )
-        .apply_index(
-            lambda x: np.where(x == "3Y", "color: blue !important", "color:black"),
-            axis=1,
-        )
-        .set_table_attributes('style="border-spacing: 0px;"')
-    )
+    styler = styler.format().hide().set_table_styles(CUSTOM_STYLE)
+    for subset, properties in COLUMN_PROPERTIES:
+        styler = styler.set_properties(subset=subset, **properties)
+    for header_style in HEADER_STYLES:
+        styler = styler.apply_index(header_style, axis=1)
+    df_result = styler.set_caption(CAPTION).set_table_attributes(TABLE_ATTRIBUTES)
     return df_result
 
 
-def main():
+@traced
+def write_table(df: pd.DataFrame, f: TextIO) -> None:
+    """Write the styled table without going through Styler
+
+    Produces the same table as `style_table`, but with one CSS rule per
+    column instead of one per cell. The rows are written straight to `f`,
+    which keeps large tables fast and small
+
+    Args:
+        df: The dataframe to be written
+        f: The file the HTML is written to
+    """
+    table = HtmlTable(
+        CUSTOM_STYLE,
+        COLUMN_PROPERTIES,
+        HEADER_STYLES,
+        caption=CAPTION,
+        table_attributes=TABLE_ATTRIBUTES,
+        template="html_template.tpl",
+    )
+    table.write(df.sort_values(by="COMPANY"), f)
+
+
+@traced
+def stream_table(chunks: Iterator[pd.DataFrame], f: TextIO) -> None:
+    """Write the styled table while its rows are being produced
+
+    Same output as `write_table`, but every chunk from `produce_table_chunks`
+    is written and flushed as soon as it's ready, so the table never has to
+    be held in memory as a whole
+
+    Args:
+        chunks: The rows of the table, already sorted
+        f: The file, stdout or socket file the HTML is written to
+    """
+    table = HtmlTable(
+        CUSTOM_STYLE,
+        COLUMN_PROPERTIES,
+        HEADER_STYLES,
+        caption=CAPTION,
+        table_attributes=TABLE_ATTRIBUTES,
+        template="html_template.tpl",
+    )
+    table.stream(chunks, f)
+
+
+def main(
+    workers: int = 1,
+    backend: str = "matplotlib",
+    embed: str = "file",
+    chunksize: Optional[int] = None,
+    writer: str = "styler",
+    output: str = "result.html",
+    embed_assets: bool = False,
+):
     """Main function
 
     We read the data, create the summary table and style it
     The result is saved as an HTML file
+
+    Args:
+        workers: The number of processes used to render the sparklines
+        backend: The sparkline renderer, either "matplotlib" or "svg"
+        embed: How the sparklines are shown, see `trend_cell`. With anything
+            but "file", the sparklines are in the HTML and `graphs/` is
+            unused. The logos and the icons of the caption are still linked
+            from `images/`
+        chunksize: Stream data.csv in chunks of this many rows
+        writer: Render the HTML with pandas "styler" or the "lean" writer. The
+            lean writer streams the table to the output while it's produced
+        output: The file the HTML is written to, "-" for stdout
+        embed_assets: Embed the delta icons once in the HTML instead of
+            linking them in every row, see `delta_icon`
     """
-    df = pd.read_csv("./data.csv", thousands=",")
-    df_graph = (
-        df.groupby("Ticker")
-        .apply(lambda x: produce_summary(x, x.name))
-        .reset_index(drop=True)
-    )
+    df = read_employees("./data.csv", chunksize)
+    output_dir = "graphs" if embed == "file" else None
+    cache = SparklineCache(output_dir) if output_dir else None
+    with stage("render_sparklines"):
+        timings, svgs = render_sparklines(
+            df, output_dir, cache=cache, workers=workers, backend=backend
+        )
+    for ticker, seconds in timings.items():
+        logging.info("Rendered sparkline for %s in %.1f ms", ticker, seconds * 1000)
+    if cache is not None:
+        logging.info(
+            "Sparkline cache: %d hits, %d misses", len(cache.hits), len(cache.misses)
+        )
+    assets = None
+    if embed_assets:
+        # Registered up front, so their styles can be written before the rows
+        assets = AssetRegistry("images")
+        for icon in DELTA_ICONS:
+            assets.use(icon)
+    if writer == "lean":
+        with open_output(output) as f:
+            f.write(assets.style() if assets else "")
+            stream_table(produce_table_chunks(df, svgs, embed, assets), f)
+        return
+    df_graph = produce_table(df, svgs, embed, assets)
     df_result = style_table(df_graph)
-    html = HTML(df_result.to_html())  # We can use Jinja2 if needed to render the HTML
-    with open("result.html", "w") as f:
-        f.write(html.data)
+    with stage("to_html") as current:
+        current.result = df_result.to_html()
+    with open_output(output) as f:
+        f.write(assets.style() if assets else "")
+        f.write(current.result)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Tech industry employment trends")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to render the sparklines",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=sorted(RENDERERS),
+        default="matplotlib",
+        help="Render sparklines with matplotlib or write the SVG directly",
+    )
+    parser.add_argument(
+        "--embed",
+        choices=EMBED_MODES,
+        default="file",
+        help="Link the sparklines from graphs/ or embed them in the HTML, the "
+        "logos are linked from images/ either way",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Stream data.csv in chunks of this many rows",
+    )
+    parser.add_argument(
+        "--writer",
+        choices=("styler", "lean"),
+        default="styler",
+        help="Render the HTML with pandas Styler or the lean table writer",
+    )
+    parser.add_argument(
+        "--output",
+        default="result.html",
+        help='The file the HTML is written to, "-" for stdout',
+    )
+    parser.add_argument(
+        "--embed-assets",
+        action="store_true",
+        help="Embed the delta icons once in the HTML instead of linking them",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(
+        workers=args.workers,
+        backend=args.backend,
+        embed=args.embed,
+        chunksize=args.chunksize,
+        writer=args.writer,
+        output=args.output,
+        embed_assets=args.embed_assets,
+    )
@@ -0,0 +1,511 @@
+"""Batch rendering of the W13 sparklines
+
+Creating a new matplotlib figure for every ticker is slow and, unless the
+figure gets closed, pyplot keeps a reference to every single one of them.
+The renderer below builds one figure together with its artists once and only
+swaps the data underneath them before saving each sparkline
+
+Sparklines can also be cached. The cache keeps a manifest with a hash of the
+data and the plot parameters behind every stored SVG, so a sparkline is only
+rendered again when one of them changes, or when the SVG file itself was
+modified since it was rendered
+
+`render_sparklines` renders all tickers of a dataframe, optionally spread
+across several worker processes that each reuse their own figure
+
+Besides matplotlib, sparklines can be written directly as SVG path data. The
+result looks the same, but skips figures and `savefig` altogether
+
+Instead of being stored as files, the SVG markup can also be returned so it
+can be embedded straight into the HTML report
+"""
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, TextIO, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Years that get a dot on top of the line. 2019 is highlighted in blue
+HIGHLIGHT_YEARS = (2009, 2019, 2022)
+HIGHLIGHT_COLORS = {2019: "blue"}
+HIGHLIGHT_HEX = {2019: "#0000ff"}
+
+# Matplotlib defaults mirrored by the SVG backend
+POINTS_PER_INCH = 72
+AXES_WIDTH = 0.9 - 0.125  # figure.subplot.right - figure.subplot.left
+AXES_HEIGHT = 0.88 - 0.11  # figure.subplot.top - figure.subplot.bottom
+TIGHT_PAD = 0.1 * POINTS_PER_INCH  # savefig.pad_inches
+MARGIN = 0.05  # axes.xmargin and axes.ymargin
+DOT_RADIUS = 3.535534  # sqrt(s=50) / 2
+
+
+def sparkline_params(figsize: Tuple = (5, 1), backend: str = "matplotlib") -> Dict:
+    """The parameters every sparkline is plotted with, used for caching
+
+    Args:
+        figsize: The size of the figure in inches
+        backend: The name of the renderer producing the sparkline
+
+    Returns:
+        A JSON serializable description of the plot parameters
+    """
+    return {
+        "figsize": list(figsize),
+        "highlight_years": list(HIGHLIGHT_YEARS),
+        "highlight_colors": {str(k): v for k, v in HIGHLIGHT_COLORS.items()},
+        "format": "svg",
+        "backend": backend,
+    }
+
+
+class SparklineCache:
+    """Keep track of which stored sparklines are still up to date
+
+    Every sparkline is identified by a hash of its (Year, Number) series and
+    the parameters it was plotted with. The hashes are stored in a JSON
+    manifest next to the SVG files together with a hash of every SVG file and
+    the hits and misses of the last run
+
+    Args:
+        output_dir: The directory where the SVG files are stored
+        manifest: The name of the manifest file inside `output_dir`
+    """
+
+    def __init__(self, output_dir: str = "graphs", manifest: str = "manifest.json"):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, manifest)
+        # The key and the SHA-256 of the SVG file of every ticker
+        self.entries: Dict[str, Dict[str, str]] = {}
+        self.hits: List[str] = []
+        self.misses: List[str] = []
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f).get("entries", {})
+
+    @staticmethod
+    def key(df: pd.DataFrame, params: Dict) -> str:
+        """Hash the series of a ticker together with the plot parameters
+
+        Args:
+            df: The data of a single ticker
+            params: The parameters the sparkline is plotted with
+
+        Returns:
+            The hex digest identifying the sparkline
+        """
+        df = df.sort_values(by="Year")
+        digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+        digest.update(df["Year"].to_numpy(dtype=np.int64).tobytes())
+        digest.update(df["Number"].to_numpy(dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def svg_path(self, ticker: str) -> str:
+        """The SVG file of a ticker"""
+        return os.path.join(self.output_dir, f"{ticker}.svg")
+
+    def svg_digest(self, ticker: str) -> Optional[str]:
+        """The SHA-256 of the SVG file of a ticker, None if it's missing"""
+        path = self.svg_path(ticker)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def lookup(self, ticker: str, key: str) -> bool:
+        """Check if the stored sparkline of a ticker matches the given key
+
+        The SVG file must also be the one rendered, a file edited or
+        corrupted since is rendered again. The outcome is recorded as a hit
+        or a miss
+
+        Args:
+            ticker: The ticker of the company
+            key: The key calculated for the current data
+
+        Returns:
+            True if the stored SVG can be reused
+        """
+        entry = self.entries.get(ticker)
+        hit = (
+            isinstance(entry, dict)
+            and entry["key"] == key
+            and entry["svg"] == self.svg_digest(ticker)
+        )
+        (self.hits if hit else self.misses).append(ticker)
+        return hit
+
+    def store(self, ticker: str, key: str) -> None:
+        """Record the key and the SVG file of a freshly rendered sparkline"""
+        self.entries[ticker] = {"key": key, "svg": self.svg_digest(ticker)}
+
+    def save(self) -> None:
+        """Write the manifest to disk"""
+        with open(self.path, "w") as f:
+            json.dump(
+                {"entries": self.entries, "hits": self.hits, "misses": self.misses},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+
+
+class BaseSparklineRenderer:
+    """Common logic of the sparkline renderers
+
+    Takes care of the cache, the timings and of storing the SVG files, while
+    the subclasses implement `draw`. `to_svg` returns the markup instead of
+    storing it, in which case the cache isn't used. A renderer can be used as a context
+    manager, which calls `close` on exit
+
+    When a cache is given, sparklines whose data and parameters didn't change
+    since they were stored are skipped. The manifest is saved on `close`
+
+    Args:
+        output_dir: The directory where the SVG files are stored, None when
+            the sparklines are only returned by `to_svg`
+        figsize: The size of the sparkline in inches
+        cache: A cache of the sparklines stored in `output_dir`
+
+    Attributes:
+        timings: Render time in seconds for every ticker rendered so far
+        params: The parameters every sparkline is plotted with
+    """
+
+    backend = ""
+
+    def __init__(
+        self,
+        output_dir: Optional[str] = "graphs",
+        figsize: Tuple = (5, 1),
+        cache: Optional[SparklineCache] = None,
+    ):
+        self.output_dir = output_dir
+        self.figsize = figsize
+        self.cache = cache
+        self.timings: Dict[str, float] = {}
+        self.params = sparkline_params(figsize, self.backend)
+
+    def draw(self, years: np.ndarray, numbers: np.ndarray, f: TextIO) -> None:
+        """Draw a sparkline and write its SVG to `f`
+
+        Args:
+            years: The sorted years of the series
+            numbers: The number of employees for every year
+            f: The text file the SVG is written to
+        """
+        raise NotImplementedError
+
+    def _draw_series(self, df: pd.DataFrame, f: TextIO) -> None:
+        """Sort the data of a ticker and draw it"""
+        df = df.sort_values(by="Year")
+        self.draw(
+            df["Year"].to_numpy(dtype=float), df["Number"].to_numpy(dtype=float), f
+        )
+
+    def render(self, df: pd.DataFrame, ticker: str) -> float:
+        """Plot the sparkline of a single ticker and store it as an SVG
+
+        Args:
+            df: The data we'll be plotting
+            ticker: The ticker of the company used in the file name when saving
+
+        Returns:
+            The time in seconds it took to render the sparkline, 0 when the
+            cached sparkline was reused
+        """
+        if self.cache is not None:
+            key = self.cache.key(df, self.params)
+            if self.cache.lookup(ticker, key):
+                return 0.0
+        start = time.perf_counter()
+        with open(f"{self.output_dir}/{ticker}.svg", "w", encoding="utf-8") as f:
+            self._draw_series(df, f)
+        elapsed = time.perf_counter() - start
+        self.timings[ticker] = elapsed
+        if self.cache is not None:
+            self.cache.store(ticker, key)
+        return elapsed
+
+    def to_svg(self, df: pd.DataFrame, ticker: str) -> str:
+        """Plot the sparkline of a single ticker and return its SVG
+
+        Args:
+            df: The data we'll be plotting
+            ticker: The ticker of the company, used for the timings
+
+        Returns:
+            The SVG document of the sparkline
+        """
+        start = time.perf_counter()
+        buffer = io.StringIO()
+        self._draw_series(df, buffer)
+        self.timings[ticker] = time.perf_counter() - start
+        return buffer.getvalue()
+
+    def close(self) -> None:
+        """Save the cache"""
+        if self.cache is not None:
+            self.cache.save()
+
+    def __enter__(self) -> "BaseSparklineRenderer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class SparklineRenderer(BaseSparklineRenderer):
+    """Render many sparklines while reusing a single matplotlib figure
+
+    The figure, the line, the area underneath it and the dots are created
+    once. For every ticker we only update their data, rescale the axes and
+    save the result. The figure is released by calling `close`
+    """
+
+    backend = "matplotlib"
+
+    def __init__(
+        self,
+        output_dir: Optional[str] = "graphs",
+        figsize: Tuple = (5, 1),
+        cache: Optional[SparklineCache] = None,
+    ):
+        # pyplot is only imported once a matplotlib renderer is needed, so the
+        # "svg" backend never pays for it
+        import matplotlib.pyplot as plt
+
+        super().__init__(output_dir, figsize, cache)
+        self.fig, self.ax = plt.subplots(figsize=figsize)
+        (self.line,) = self.ax.plot([], [], color="black")
+        self.area = self.ax.fill_between(
+            [], [], alpha=0.15, color="slategray", linewidth=0
+        )
+        self.dots = self.ax.scatter(
+            [], [], s=50, linewidth=0, zorder=2, clip_on=False
+        )
+        self.ax.set(
+            xlabel="", ylabel="", xticklabels=[], xticks=[], yticklabels=[], yticks=[]
+        )
+        for spine in self.ax.spines.values():
+            spine.set_visible(False)
+
+    def draw(self, years: np.ndarray, numbers: np.ndarray, f: TextIO) -> None:
+        self.line.set_data(years, numbers)
+        # Same vertex order as `fill_between`: along the line, then back on 0
+        baseline = np.column_stack([years[::-1], np.zeros_like(years)])
+        self.area.set_verts(
+            [
+                np.concatenate(
+                    [
+                        [[years[0], 0]],
+                        np.column_stack([years, numbers]),
+                        [[years[-1], 0]],
+                        baseline,
+                    ]
+                )
+            ]
+        )
+        highlighted = np.isin(years, HIGHLIGHT_YEARS)
+        self.dots.set_offsets(np.column_stack([years, numbers])[highlighted])
+        self.dots.set_facecolor(
+            [HIGHLIGHT_COLORS.get(int(year), "black") for year in years[highlighted]]
+        )
+
+        # The artists were updated in place, so we rescale the axes ourselves
+        self.ax.ignore_existing_data_limits = True
+        self.ax.update_datalim(np.column_stack([years, numbers]))
+        self.ax.update_datalim(np.column_stack([years, np.zeros_like(years)]))
+        self.ax.autoscale_view()
+
+        self.fig.savefig(f, format="svg", bbox_inches="tight", transparent=True)
+
+    def close(self) -> None:
+        """Release the figure held by the renderer and save the cache"""
+        import matplotlib.pyplot as plt
+
+        plt.close(self.fig)
+        super().close()
+
+
+def _limits(low: float, high: float) -> Tuple[float, float]:
+    """Axis limits the way matplotlib autoscales them, with 5% margins"""
+    if high - low == 0:
+        # Matplotlib expands a singular range by 5% of its value instead
+        expand = 0.05 * abs(low) if low else 0.05
+        low, high = low - expand, high + expand
+    margin = MARGIN * (high - low)
+    return low - margin, high + margin
+
+
+def _format(values: np.ndarray) -> List[str]:
+    """Format coordinates with at most 6 decimals, like matplotlib does"""
+    return [f"{value:.6f}".rstrip("0").rstrip(".") for value in values]
+
+
+def sparkline_svg(years: np.ndarray, numbers: np.ndarray, figsize=(5, 1)) -> str:
+    """Write the SVG of a sparkline without going through matplotlib
+
+    The geometry mirrors what `SparklineRenderer` produces: an axes area using
+    matplotlib's default subplot size on a `figsize` canvas, cropped like
+    `bbox_inches="tight"` does, with 5% margins around the data. The area
+    underneath the line goes down to 0
+
+    Args:
+        years: The sorted years of the series
+        numbers: The number of employees for every year
+        figsize: The size of the sparkline in inches
+
+    Returns:
+        The `<svg>` element of the sparkline
+    """
+    axes_width = figsize[0] * POINTS_PER_INCH * AXES_WIDTH
+    axes_height = figsize[1] * POINTS_PER_INCH * AXES_HEIGHT
+    width = axes_width + 2 * TIGHT_PAD
+    height = axes_height + 2 * TIGHT_PAD
+
+    x_low, x_high = _limits(years.min(), years.max())
+    y_low, y_high = _limits(min(numbers.min(), 0), max(numbers.max(), 0))
+    x = TIGHT_PAD + (years - x_low) / (x_high - x_low) * axes_width
+    y = TIGHT_PAD + (y_high - numbers) / (y_high - y_low) * axes_height
+    y_zero = TIGHT_PAD + y_high / (y_high - y_low) * axes_height
+
+    xs, ys = _format(x), _format(y)
+    line = " L ".join(f"{a} {b}" for a, b in zip(xs, ys))
+    zero = _format([y_zero])[0]
+    highlighted = np.isin(years, HIGHLIGHT_YEARS)
+    dots = "".join(
+        f'<circle cx="{xs[i]}" cy="{ys[i]}" r="{DOT_RADIUS}" '
+        f'style="fill: {HIGHLIGHT_HEX.get(int(years[i]), "#000000")}"/>'
+        for i in np.flatnonzero(highlighted)
+    )
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+        f'width="{_format([width])[0]}pt" height="{_format([height])[0]}pt" '
+        f'viewBox="0 0 {_format([width])[0]} {_format([height])[0]}">'
+        f'<path d="M {xs[0]} {zero} L {line} L {xs[-1]} {zero} Z" '
+        'style="fill: #708090; fill-opacity: 0.15"/>'
+        f'<path d="M {line}" style="fill: none; stroke: #000000; '
+        'stroke-width: 1.5; stroke-linecap: square; stroke-linejoin: round"/>'
+        f"{dots}</svg>"
+    )
+
+
+class SvgSparklineRenderer(BaseSparklineRenderer):
+    """Render sparklines by writing the SVG directly
+
+    Visually equivalent to `SparklineRenderer`, but skips matplotlib
+    altogether, which makes it a lot faster for large tables
+    """
+
+    backend = "svg"
+
+    def draw(self, years: np.ndarray, numbers: np.ndarray, f: TextIO) -> None:
+        f.write(sparkline_svg(years, numbers, self.figsize))
+
+
+RENDERERS = {
+    SparklineRenderer.backend: SparklineRenderer,
+    SvgSparklineRenderer.backend: SvgSparklineRenderer,
+}
+
+
+# The renderer owned by a worker process, created once by `_init_worker`
+_worker_renderer: Optional[BaseSparklineRenderer] = None
+
+
+def _init_worker(output_dir: Optional[str], backend: str) -> None:
+    """Create the renderer of a worker process using the Agg backend"""
+    global _worker_renderer
+    if backend == "matplotlib":
+        import matplotlib.pyplot as plt
+
+        plt.switch_backend("Agg")
+    _worker_renderer = RENDERERS[backend](output_dir)
+
+
+def _render_in_worker(
+    item: Tuple[str, pd.DataFrame]
+) -> Tuple[str, float, Optional[str]]:
+    """Render a single ticker with the renderer of the worker process"""
+    ticker, df = item
+    if _worker_renderer.output_dir is None:
+        svg = _worker_renderer.to_svg(df, ticker)
+        return ticker, _worker_renderer.timings[ticker], svg
+    return ticker, _worker_renderer.render(df, ticker), None
+
+
+def render_sparklines(
+    df: pd.DataFrame,
+    output_dir: Optional[str] = "graphs",
+    cache: Optional[SparklineCache] = None,
+    workers: int = 1,
+    backend: str = "matplotlib",
+) -> Tuple[Dict[str, float], Dict[str, str]]:
+    """Render the sparklines of all tickers in a dataframe
+
+    With more than one worker the tickers are spread across a pool of
+    processes. Each of them renders with the Agg backend and reuses a single
+    figure. The cache is only consulted in the main process, so only the
+    sparklines that need rendering are sent to the workers. The manifest is
+    saved once all sparklines are rendered
+
+    Without an output directory nothing is written to disk and the SVG
+    markup of every ticker is returned instead
+
+    Args:
+        df: The data of all tickers
+        output_dir: The directory where the SVG files are stored
+        cache: A cache of the sparklines stored in `output_dir`
+        workers: The number of processes used for rendering
+        backend: The renderer to use, either "matplotlib" or "svg"
+
+    Returns:
+        The render time in seconds of every rendered ticker and the SVG of
+        every ticker when `output_dir` is None, both ordered by ticker
+    """
+    groups = [
+        (ticker, df_ticker[["Year", "Number"]])
+        for ticker, df_ticker in df.groupby("Ticker")
+    ]
+    if output_dir is None:
+        cache = None
+    if workers <= 1:
+        svgs = {}
+        with RENDERERS[backend](output_dir, cache=cache) as renderer:
+            for ticker, df_ticker in groups:
+                if output_dir is None:
+                    svgs[ticker] = renderer.to_svg(df_ticker, ticker)
+                else:
+                    renderer.render(df_ticker, ticker)
+        return renderer.timings, svgs
+
+    keys = {}
+    if cache is not None:
+        params = sparkline_params(backend=backend)
+        pending = []
+        for ticker, df_ticker in groups:
+            keys[ticker] = cache.key(df_ticker, params)
+            if not cache.lookup(ticker, keys[ticker]):
+                pending.append((ticker, df_ticker))
+        groups = pending
+
+    chunksize = max(1, len(groups) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(output_dir, backend),
+    ) as executor:
+        results = list(executor.map(_render_in_worker, groups, chunksize=chunksize))
+    timings = {ticker: elapsed for ticker, elapsed, _ in results}
+    svgs = {ticker: svg for ticker, _, svg in results if svg is not None}
+
+    if cache is not None:
+        for ticker in timings:
+            cache.store(ticker, keys[ticker])
+        cache.save()
+    return timings, svgs
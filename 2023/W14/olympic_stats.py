@@ -1,8 +1,157 @@
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
-from typing import Tuple
-from IPython.display import HTML
-from pandas.io.formats.style import Styler
+from typing import Dict, Optional, Sequence, TextIO, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pretty_python.assets import AssetRegistry  # noqa: E402
+from pretty_python.cells import CellTemplate  # noqa: E402
+from pretty_python.html_table import HtmlTable, open_output  # noqa: E402
+from pretty_python.loaders import load_table  # noqa: E402
+from pretty_python.tracing import stage, traced  # noqa: E402
+
+# The only columns of the CSV files used by `prepare_data`
+MEDAL_COLUMNS = [
+    "countries ",
+    "ioc_code ",
+    "winter_gold",
+    "winter_silver",
+    "winter_bronze",
+    "winter_total",
+]
+POPULATION_COLUMNS = ["CCA3", "2022 Population"]
+
+# The medal columns of every season, for the leaderboards of the batch mode.
+# The header of the CSV ends "total_total " with a space
+LEADERBOARD_COLUMNS = [
+    "countries ",
+    "ioc_code ",
+    "summer_gold",
+    "summer_silver",
+    "summer_bronze",
+    "summer_total",
+    "winter_gold",
+    "winter_silver",
+    "winter_bronze",
+    "winter_total",
+    "total_gold",
+    "total_silver",
+    "total_bronze",
+    "total_total ",
+]
+
+# The leaderboards of the batch mode: a season and a ranking metric, the
+# columns are named "{season}_{metric}"
+SEASONS = ("summer", "winter", "total")
+METRICS = ("gold", "total")
+
+# Teams whose medals are counted for another country, by team name
+ALIASES = {
+    "United Team of Germany": "Germany",
+    "East Germany": "Germany",
+    "West Germany": "Germany",
+}
+
+# The ISO 3166 code of the countries whose IOC code differs from it
+# fmt: off
+IOC_TO_CCA3 = {
+    "ALG": "DZA", "BAH": "BHS", "BAR": "BRB", "BER": "BMU", "BOT": "BWA",
+    "BUL": "BGR", "BUR": "BFA", "CHI": "CHL", "CRC": "CRI", "CRO": "HRV",
+    "DEN": "DNK", "FIJ": "FJI", "GER": "DEU", "GRE": "GRC", "GRN": "GRD",
+    "GUA": "GTM", "HAI": "HTI", "INA": "IDN", "IRI": "IRN", "ISV": "VIR",
+    "KSA": "SAU", "KUW": "KWT", "LAT": "LVA", "MAS": "MYS", "MGL": "MNG",
+    "MRI": "MUS", "NED": "NLD", "NGR": "NGA", "NIG": "NER", "PAR": "PRY",
+    "PHI": "PHL", "POR": "PRT", "PUR": "PRI", "RSA": "ZAF", "SAM": "WSM",
+    "SLO": "SVN", "SRI": "LKA", "SUD": "SDN", "SUI": "CHE", "TAN": "TZA",
+    "TGA": "TON", "TOG": "TGO", "TPE": "TWN", "UAE": "ARE", "URU": "URY",
+    "VIE": "VNM", "ZAM": "ZMB", "ZIM": "ZWE",
+    # Russian athletes competing under a neutral name
+    "OAR": "RUS", "ROC": "RUS",
+}
+# fmt: on
+
+# The population of countries that no longer exist, by IOC code. The Unified
+# Team of 1992 is counted like the Soviet Union
+FORMER_POPULATION = {"URS": 241730819, "EUN": 241730819, "TCH": 15576550}
+
+# The predecessors and stand-in teams of today's countries, merged on request
+SUCCESSOR_ALIASES = {
+    "Russian Empire": "Russia",
+    "Soviet Union": "Russia",
+    "Unified Team": "Russia",
+    "Olympic Athletes from Russia": "Russia",
+    "ROC": "Russia",
+    "Bohemia": "Czech Republic",
+    "Czechoslovakia": "Czech Republic",
+    "Yugoslavia": "Serbia",
+    "Serbia and Montenegro": "Serbia",
+}
+
+# Templates of the HTML cells, parsed once and rendered a column at a time.
+# The images are linked from {images}, the image directory seen from the HTML
+FLAG_CELL = CellTemplate(
+    '<img style="max-height:50px; max-width:50px;" src="{images}/{country}.svg"/>'
+)
+MEDALS_CELL = CellTemplate(
+    '<div style="text-align:left; position:relative">'
+    '<img style="max-height: 30px;" width={gold_width}px src="{images}/Gold.png"/>'
+    '<img style="max-height: 30px;" width={silver_width}px src="{images}/Silver.png"/>'
+    '<img style="max-height: 30px; padding-right: 50px" width={bronze_width}px src="{images}/Bronze.png"/>'
+    '<div class="color_bars" style="color: #2f2f2f; left: {gold_left}px;">{gold}</div>'
+    '<div class="color_bars" style="color: #e2e2e2; left: {silver_left}px;">{silver}</div>'
+    '<div class="color_bars" style="color: #ffffff; left: {bronze_left}px;">{bronze}</div>'
+    "</div>"
+)
+POPULATION_CELL = CellTemplate(
+    '<img style="max-height:50px; max-width:50px;" width={width}px src="{images}/Circle.svg"/>'
+)
+MEDALS_HEADER = (
+    '<div style="text-align:center; position: relative">'
+    '<img width=25px src="{images}/Gold.png"/><span class="header_medals">Gold</span>'
+    '<img width=25px src="{images}/Silver.png"/><span class="header_medals">Silver</span>'
+    '<img width=25px src="{images}/Bronze.png"/><span class="header_medals">Bronze</span>'
+    "</div>"
+)
+
+# Pixels per medal in the bars, shrunk when the longest bar would be wider
+# than BAR_WIDTH, like for the summer leaderboards
+MEDAL_WIDTH = 1.7
+BAR_WIDTH = 750
+
+# The same cells showing the images through the classes of an `AssetRegistry`,
+# so every image is embedded once in the document
+MEDAL_ASSETS = ["Gold.png", "Silver.png", "Bronze.png", "Circle.svg"]
+EMBEDDED_FLAG_CELL = CellTemplate(
+    '<span class="{flag}" style="width: 50px; max-height: 50px;"></span>'
+)
+EMBEDDED_MEDALS_CELL = CellTemplate(
+    '<div style="text-align:left; position:relative">'
+    '<span class="asset-Gold" style="max-height: 30px; width: {gold_width}px;"></span>'
+    '<span class="asset-Silver" style="max-height: 30px; width: {silver_width}px;"></span>'
+    '<span class="asset-Bronze" style="max-height: 30px; padding-right: 50px; width: {bronze_width}px;"></span>'
+    '<div class="color_bars" style="color: #2f2f2f; left: {gold_left}px;">{gold}</div>'
+    '<div class="color_bars" style="color: #e2e2e2; left: {silver_left}px;">{silver}</div>'
+    '<div class="color_bars" style="color: #ffffff; left: {bronze_left}px;">{bronze}</div>'
+    "</div>"
+)
+EMBEDDED_POPULATION_CELL = CellTemplate(
+    '<span class="asset-Circle" style="max-height:50px; max-width:50px; width: {width}px;"></span>'
+)
+EMBEDDED_MEDALS_HEADER = (
+    '<div style="text-align:center; position: relative">'
+    '<span class="asset-Gold" style="width: 25px;"></span><span class="header_medals">Gold</span>'
+    '<span class="asset-Silver" style="width: 25px;"></span><span class="header_medals">Silver</span>'
+    '<span class="asset-Bronze" style="width: 25px;"></span><span class="header_medals">Bronze</span>'
+    "</div>"
+)
 
 CUSTOM_STYLE = [
     # Table column headers
@@ -75,108 +224,252 @@ CUSTOM_STYLE = [
     },
 ]
 
+# Properties of the cells, in the order they are applied to the columns
+COLUMN_PROPERTIES = [
+    (["Total<br>amount"], {"text-align": "center", "padding-right": "20px"}),
+    ([""], {"padding": "20px"}),
+    ([" "], {"padding-right": "20px"}),
+    (["Population<br>size"], {"text-align": "center"}),
+]
+
+# Styles of the column headers
+HEADER_STYLES = [
+    lambda x: np.where(
+        x == "Total<br>amount",
+        "padding-right: 20px",
+        "font-family: Archivo",
+    ),
+]
+
+# Table caption, shown as a footer
+CAPTION = (
+    '<div style="display: flex; justify-content:space-between">'
+    '<div style="order: 1">'
+    '<span style="text-align:left; display: inline; color: #787878;'
+    'font-size: 12px;"> Source: <strong>Kaggle</strong> | W14 pretty-python'
+    "</span></div>"
+    '<div style="order:2">'
+    '<img style="margin-bottom:-2px; display:inline" '
+    'src="images/twitter.svg" width=12/>'
+    '<span style="color: #787878; font-size:12px; text-align:right">'
+    " @masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
+    '<img style="margin-bottom:-2px; display:inline" '
+    'src="images/github.svg" width=12/>'
+    '<span style="color: #787878; font-size:12px; text-align:right">'
+    " ilko-masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
+    '<img style="margin-bottom:-2px; display:inline" '
+    'src="images/linkedin.svg" width=12/>'
+    '<span style="color: #787878; font-size:12px; text-align:right">'
+    " masaldzhiyski</span></div></div>"
+)
+
+TABLE_ATTRIBUTES = 'style="border-spacing: 0px;"'
+
+# The heading of every leaderboard, in place of the one in html_template.tpl
+LEADERBOARD_HEADING = (
+    '<h1 style="display: inline; font-family: Archivo;">'
+    "Who has the highest {season} {metric} count?</h1>\n"
+    "    <h2 style=\"color: #A2A2A2; font-family: 'Archivo'; margin-top: 15px;"
+    ' margin-bottom:25px;">All-time {metric} count of the {top} most successful'
+    " nations at the {games}</h2>"
+)
+SEASON_NAMES = {
+    "summer": ("Summer Olympics", "Summer Olympic Games since 1896"),
+    "winter": ("Winter Olympics", "Winter Olympic Games since 1924"),
+    "total": ("Olympics", "Summer and Winter Olympic Games since 1896"),
+}
+METRIC_NAMES = {"gold": "gold medal", "total": "medal"}
+
+
+def country_key(codes: pd.Series) -> pd.arrays.IntegerArray:
+    """Pack three-letter country codes into integers.
+
+    The letters are read as a number in base 26, so "AAA" is 0 and "ZZZ" is
+    17575, which lets the medal and population tables be joined on integers.
 
+    Args:
+        codes (pd.Series): Codes like "NOR", NaN when a country has none.
+
+    Returns:
+        pd.arrays.IntegerArray: The key of every code, NA for the missing and
+            malformed ones, so they never match each other in a join.
+    """
+    padded = codes.fillna("").to_numpy(dtype="S3")
+    letters = np.frombuffer(padded.tobytes(), dtype=np.uint8).reshape(-1, 3)
+    letters = letters.astype(np.int64) - ord("A")
+    keys = letters @ np.array([26 * 26, 26, 1])
+    valid = ((letters >= 0) & (letters < 26)).all(axis=1)
+    return pd.arrays.IntegerArray(keys, ~valid)
+
+
+def consolidate_entities(
+    df: pd.DataFrame, aliases: Dict[str, str] = ALIASES
+) -> pd.DataFrame:
+    """Merge the medals of teams into the country they're counted for.
+
+    Every team name is looked up once in the alias table, and the medals of
+    all the teams of a country are summed in a single groupby, so the cost
+    stays linear in the number of rows however many teams are merged.
+
+    Args:
+        df (pd.DataFrame): Dataframe with country, ioc_code and medal columns.
+        aliases (Dict[str, str]): The country of every merged team.
+
+    Returns:
+        pd.DataFrame: One row per country, in the order they first appear.
+    """
+    country = df["country"].str.strip()
+    canonical = country.map(aliases).fillna(country)
+    # Every country keeps its own code, not the code of a merged team
+    code = df["ioc_code"].where(canonical == country)
+    df = df.assign(country=canonical, ioc_code=code)
+    counts = df.columns.drop(["country", "ioc_code"])
+    aggregations = {"ioc_code": "first", **{column: "sum" for column in counts}}
+    return df.groupby("country", sort=False, as_index=False).agg(aggregations)
+
+
+@traced
 def prepare_data(
-    df: pd.DataFrame, df_pop: pd.DataFrame
+    df: pd.DataFrame, df_pop: pd.DataFrame, aliases: Dict[str, str] = ALIASES
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """Prepare data for plotting.
 
     Args:
         df (pd.DataFrame): Dataframe with Olympic medal data.
         df_pop (pd.DataFrame): Dataframe with population data.
+        aliases (Dict[str, str]): The teams merged into another country, see
+            `consolidate_entities`.
 
     Returns:
         Tuple[pd.DataFrame, pd.DataFrame]: Dataframes with prepared data.
     """
-    df = df[
-        ["countries ", "winter_gold", "winter_silver", "winter_bronze", "winter_total"]
-    ].copy()
-    df.rename(columns={"countries ": "country"}, inplace=True)
-    df.loc[df["country"] == "Germany", "winter_gold"] = df.loc[
-        df["country"].str.contains("Germany"), "winter_gold"
-    ].sum()
-    df.loc[df["country"] == "Germany", "winter_silver"] = df.loc[
-        df["country"].str.contains("Germany"), "winter_silver"
-    ].sum()
-    df.loc[df["country"] == "Germany", "winter_bronze"] = df.loc[
-        df["country"].str.contains("Germany"), "winter_bronze"
-    ].sum()
-    df.loc[df["country"] == "Germany", "winter_total"] = df.loc[
-        df["country"].str.contains("Germany"), "winter_total"
-    ].sum()
-
-    df_pop = df_pop[["Country/Territory", "2022 Population"]].copy()
-    df_pop.rename(columns={"Country/Territory": "country"}, inplace=True)
-    df_pop.loc[df_pop["country"] == "United Kingdom", "country"] = "Great Britain"
-    return df, df_pop
-
-
-def merge_data(df: pd.DataFrame, df_pop: pd.DataFrame) -> pd.DataFrame:
+    df = df.rename(columns=str.strip).rename(columns={"countries": "country"})
+    df["ioc_code"] = df["ioc_code"].str.strip(" ()")
+    df = consolidate_entities(df, aliases)
+    codes = df.pop("ioc_code")
+    df["key"] = country_key(codes.map(IOC_TO_CCA3).fillna(codes))
+
+    # Indexed by key once, so the join only looks up the rows it needs
+    population = pd.concat(
+        [df_pop.set_index("CCA3")["2022 Population"], pd.Series(FORMER_POPULATION)]
+    )
+    keys = country_key(population.index.to_series())
+    population = population[~keys.isna()]
+    if not population.index.is_unique:
+        duplicated = population.index[population.index.duplicated()].unique()
+        raise ValueError(
+            f"The population table has several rows for {', '.join(duplicated)}"
+        )
+    population.index = keys[~keys.isna()].to_numpy(dtype=np.int64)
+    return df, population.to_frame("2022 Population")
+
+
+@traced
+def merge_data(
+    df: pd.DataFrame, df_pop: pd.DataFrame, top_k: int = 10, by: str = "winter_gold"
+) -> pd.DataFrame:
     """Merge dataframes with Olympic medal data and population data.
 
+    The top countries are selected first, without sorting the whole table,
+    and only their population is looked up by country key. Countries without
+    medals are never ranked, and former teams without a known population keep
+    a missing population.
+
     Args:
         df (pd.DataFrame): Dataframe with Olympic medal data.
-        df_pop (pd.DataFrame): Dataframe with population data.
+        df_pop (pd.DataFrame): Dataframe with population data, by country key.
+        top_k (int): The number of countries kept.
+        by (str): The medal column the countries are ranked by.
 
     Returns:
         pd.DataFrame: Dataframe with merged data.
     """
-    df_geo = df.merge(how="left", right=df_pop, on="country")
-    df_geo.loc[df_geo["country"] == "Soviet Union", "2022 Population"] = 241730819
-    df_geo.sort_values(by="winter_gold", ascending=False, inplace=True)
-    df_geo = df_geo.head(10).copy()
+    df_geo = df[df[by] > 0].nlargest(top_k, by).join(df_pop, on="key")
     df_geo.reset_index(drop=True, inplace=True)
-    df_geo["2022 Population"] = df_geo["2022 Population"].astype(int)
+    df_geo["2022 Population"] = df_geo["2022 Population"].astype("Int64")
     return df_geo
 
 
-def add_html(df: pd.DataFrame) -> pd.DataFrame:
+@traced
+def add_html(
+    df: pd.DataFrame,
+    assets: Optional[AssetRegistry] = None,
+    season: str = "winter",
+    images: str = "images",
+) -> pd.DataFrame:
     """Add HTML code to dataframe.
 
+    The cells are rendered a column at a time from the templates above, with
+    the bar widths, label offsets and circle sizes calculated with NumPy.
+    Countries without a flag in images/ get an empty flag cell, and countries
+    without a population an empty population cell.
+
     Args:
         df (pd.DataFrame): Dataframe with merged data.
+        assets (AssetRegistry): Embed the flags, medals and circles once
+            through this registry instead of linking them in every cell.
+        season (str): The medals shown, one of SEASONS.
+        images (str): The directory the linked images are in, relative to the
+            HTML file.
 
     Returns:
         pd.DataFrame: Dataframe with HTML code.
     """
-    df["flag"] = df.apply(
-        lambda x: f'<img style="max-height:50px; max-width:50px;" src="images/{x["country"]}.svg"/>',
-        axis=1,
+    population = df["2022 Population"]
+    gold = df[f"{season}_gold"].to_numpy()
+    silver = df[f"{season}_silver"].to_numpy()
+    bronze = df[f"{season}_bronze"].to_numpy()
+    width = min(MEDAL_WIDTH, BAR_WIDTH / max((gold + silver + bronze).max(), 1))
+    has_flag = np.array(
+        [os.path.exists(f"images/{country}.svg") for country in df["country"]],
+        dtype=bool,
     )
-    df["medals"] = df.apply(
-        lambda x: (
-            '<div style="text-align:left; position:relative">'
-            f'<img style="max-height: 30px;" width={1.7*x["winter_gold"]}px src="images/Gold.png"/>'
-            f'<img style="max-height: 30px;" width={1.7*x["winter_silver"]}px src="images/Silver.png"/>'
-            f'<img style="max-height: 30px; padding-right: 50px" width={1.7*x["winter_bronze"]}px src="images/Bronze.png"/>'
-            f'<div class="color_bars" style="color: #2f2f2f; left: {1.7*(x["winter_gold"]/2)}px;">{x["winter_gold"]}</div>'
-            f'<div class="color_bars" style="color: #e2e2e2; left: {1.7*(x["winter_gold"] + x["winter_silver"]/2)}px;">{x["winter_silver"]}</div>'
-            f'<div class="color_bars" style="color: #ffffff; left: {1.7*(x["winter_gold"] + x["winter_silver"] + x["winter_bronze"]/2)}px;">{x["winter_bronze"]}</div>'
-            "</div>"
-        ),
-        axis=1,
+    if assets is None:
+        medals_cell, population_cell = MEDALS_CELL, POPULATION_CELL
+        medals_header = MEDALS_HEADER.format(images=images)
+        flags = FLAG_CELL.render(images=images, country=df["country"])
+    else:
+        medals_cell, population_cell = EMBEDDED_MEDALS_CELL, EMBEDDED_POPULATION_CELL
+        medals_header = EMBEDDED_MEDALS_HEADER
+        for name in MEDAL_ASSETS:
+            assets.use(name)
+        flags = EMBEDDED_FLAG_CELL.render(
+            flag=[
+                assets.use(f"{country}.svg") if found else ""
+                for country, found in zip(df["country"], has_flag)
+            ]
+        )
+    df["flag"] = np.where(has_flag, flags, "")
+    df["medals"] = medals_cell.render(
+        images=images,
+        gold_width=width * gold,
+        silver_width=width * silver,
+        bronze_width=width * bronze,
+        gold_left=width * (gold / 2),
+        silver_left=width * (gold + silver / 2),
+        bronze_left=width * (gold + silver + bronze / 2),
+        gold=gold,
+        silver=silver,
+        bronze=bronze,
     )
-    df["Population<br>size"] = df.apply(
-        lambda x: f'<img style="max-height:50px; max-width:50px;" width={5+45*x["2022 Population"]/338289857}px src="images/Circle.svg"/>',
-        axis=1,
+    circles = population_cell.render(
+        images=images,
+        width=5 + 45 * population.to_numpy(float, na_value=np.nan) / 338289857,
     )
-    df = df[["country", "flag", "medals", "winter_total", "Population<br>size"]].rename(
+    df["Population<br>size"] = np.where(population.notna(), circles, "")
+    total = f"{season}_total"
+    df = df[["country", "flag", "medals", total, "Population<br>size"]].rename(
         columns={
             "country": "",
             "flag": " ",
-            "medals": (
-                '<div style="text-align:center; position: relative">'
-                '<img width=25px src="images/Gold.png"/><span class="header_medals">Gold</span>'
-                '<img width=25px src="images/Silver.png"/><span class="header_medals">Silver</span>'
-                '<img width=25px src="images/Bronze.png"/><span class="header_medals">Bronze</span>'
-                "</div>"
-            ),
-            "winter_total": "Total<br>amount",
+            "medals": medals_header,
+            total: "Total<br>amount",
         }
     )
     return df
 
 
+@traced
 def style_table(df: pd.DataFrame) -> pd.DataFrame:
     """Style dataframe.
 
@@ -186,84 +479,249 @@ def style_table(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Styled dataframe.
     """
+    from pandas.io.formats.style import Styler
+
     MyStyler = Styler.from_custom_template(
         searchpath="", html_table="html_template.tpl"
     )
     styler = MyStyler(df)
-    df_result = (
-        styler.format()
-        .hide()
-        .set_table_styles(CUSTOM_STYLE)
-        .set_properties(
-            subset=["Total<br>amount"],
-            **{"text-align": "center", "padding-right": "20px"},
-        )
-        .set_properties(
-            subset=[""],
-            **{
-                "padding": "20px",
-            },
-        )
-        .set_properties(
-            subset=[" "],
-            **{
-                "padding-right": "20px",
-            },
-        )
-        .set_properties(
-            subset=["Population<br>size"],
-            **{
-                "text-align": "center",
-            },
-        )
-        .apply_index(
-            lambda x: np.where(
-                x == "Total<br>amount",
-                "padding-right: 20px",
-                "font-family: Archivo",
-            ),
-            axis=1,
-        )
-        .set_caption(  # This would probably be better if added to the template
-            (
-                '<div style="display: flex; justify-content:space-between">'
-                '<div style="order: 1">'
-                '<span style="text-align:left; display: inline; color: #787878;'
-                'font-size: 12px;"> Source: <strong>Kaggle</strong> | W14 pretty-python'
-                "</span></div>"
-                '<div style="order:2">'
-                '<img style="margin-bottom:-2px; display:inline" '
-                'src="images/twitter.svg" width=12/>'
-                '<span style="color: #787878; font-size:12px; text-align:right">'
-                " @masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
-                '<img style="margin-bottom:-2px; display:inline" '
-                'src="images/github.svg" width=12/>'
-                '<span style="color: #787878; font-size:12px; text-align:right">'
-                " ilko-masaldzhiyski&nbsp;&nbsp;&nbsp;</span>"
-                '<img style="margin-bottom:-2px; display:inline" '
-                'src="images/linkedin.svg" width=12/>'
-                '<span style="color: #787878; font-size:12px; text-align:right">'
-                " masaldzhiyski</span></div></div>"
-            )
-        )
-        .set_table_attributes('style="border-spacing: 0px;"')
-    )
+    styler = styler.format().hide().set_table_styles(CUSTOM_STYLE)
+    for subset, properties in COLUMN_PROPERTIES:
+        styler = styler.set_properties(subset=subset, **properties)
+    for header_style in HEADER_STYLES:
+        styler = styler.apply_index(header_style, axis=1)
+    df_result = styler.set_caption(CAPTION).set_table_attributes(TABLE_ATTRIBUTES)
     return df_result
 
 
-def main():
-    """Main function."""
+@traced
+def write_table(df: pd.DataFrame, f: TextIO) -> None:
+    """Write the styled table without going through Styler.
+
+    Produces the same table as `style_table`, with one CSS rule per column
+    instead of one per cell, writing the rows straight to `f`.
+
+    Args:
+        df (pd.DataFrame): Dataframe with HTML code.
+        f (TextIO): File the HTML is written to.
+    """
+    table = HtmlTable(
+        CUSTOM_STYLE,
+        COLUMN_PROPERTIES,
+        HEADER_STYLES,
+        caption=CAPTION,
+        table_attributes=TABLE_ATTRIBUTES,
+        template="html_template.tpl",
+    )
+    table.write(df, f)
+
+
+def leaderboard_heading(season: str, metric: str, top: int) -> str:
+    """Build the title and subtitle of a leaderboard.
+
+    Args:
+        season (str): The season, one of SEASONS.
+        metric (str): The ranking metric, one of METRICS.
+        top (int): The number of countries shown.
+
+    Returns:
+        str: The HTML of the heading.
+    """
+    name, games = SEASON_NAMES[season]
+    return LEADERBOARD_HEADING.format(
+        season=name, metric=METRIC_NAMES[metric], top=top, games=games
+    )
+
+
+@traced
+def render_leaderboards(
+    df: pd.DataFrame,
+    df_pop: pd.DataFrame,
+    seasons: Sequence[str] = SEASONS,
+    metrics: Sequence[str] = METRICS,
+    tops: Sequence[int] = (10,),
+    output_dir: str = "leaderboards",
+    embed_assets: bool = False,
+) -> Dict[str, float]:
+    """Write a leaderboard for every season, ranking metric and top N.
+
+    The countries are ranked and joined with their population once for
+    every season and metric, for the largest N, and the smaller tops are the
+    first rows of that ranking. Every leaderboard is written by the same
+    `HtmlTable`, so the template is read only once.
 
-    df = pd.read_csv("olympic_stats.csv", thousands=",")
-    df_pop = pd.read_csv("world_population.csv")
-    df, df_pop = prepare_data(df, df_pop)
+    Args:
+        df (pd.DataFrame): Dataframe with the medals of every season, see
+            `prepare_data`.
+        df_pop (pd.DataFrame): Dataframe with population data, by country key.
+        seasons (Sequence[str]): The seasons, see SEASONS.
+        metrics (Sequence[str]): The ranking metrics, see METRICS.
+        tops (Sequence[int]): The numbers of countries shown.
+        output_dir (str): The directory the leaderboards are written to.
+        embed_assets (bool): Embed the images in every leaderboard instead of
+            linking them. They are still read only once.
+
+    Returns:
+        Dict[str, float]: The seconds spent on every leaderboard, by file name.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # The images are linked from the directory of the chart
+    images = os.path.relpath("images", output_dir)
+    table = HtmlTable(
+        CUSTOM_STYLE,
+        COLUMN_PROPERTIES,
+        HEADER_STYLES,
+        caption=CAPTION.replace('src="images/', f'src="{images}/'),
+        table_attributes=TABLE_ATTRIBUTES,
+        template="html_template.tpl",
+    )
+    before = table.before
+    timings = {}
+    for season in seasons:
+        for metric in metrics:
+            df_ranked = merge_data(df, df_pop, max(tops), by=f"{season}_{metric}")
+            for top in sorted(tops):
+                start = time.perf_counter()
+                name = f"{season}-{metric}-top{top}.html"
+                heading = leaderboard_heading(season, metric, top)
+                table.before = re.sub(
+                    r"<h1.*</h2>", lambda _: heading, before, flags=re.DOTALL
+                )
+                assets = AssetRegistry("images") if embed_assets else None
+                df_html = add_html(df_ranked.head(top).copy(), assets, season, images)
+                with open(os.path.join(output_dir, name), "w") as f:
+                    f.write(assets.style() if assets else "")
+                    table.write(df_html, f)
+                timings[name] = time.perf_counter() - start
+    return timings
+
+
+def main(
+    writer: str = "styler",
+    output: str = "result.html",
+    embed_assets: bool = False,
+    merge_successors: bool = False,
+    leaderboards: bool = False,
+    seasons: Sequence[str] = SEASONS,
+    metrics: Sequence[str] = METRICS,
+    tops: Sequence[int] = (10,),
+    output_dir: str = "leaderboards",
+):
+    """Main function.
+
+    Args:
+        writer (str): Render the HTML with pandas "styler" or the "lean" writer.
+        output (str): The file the HTML is written to, "-" for stdout.
+        embed_assets (bool): Embed the images once in the HTML instead of
+            linking them in every row.
+        merge_successors (bool): Count the medals of the Soviet Union,
+            Czechoslovakia and Yugoslavia, and of their stand-in teams, for
+            the countries succeeding them.
+        leaderboards (bool): Write a leaderboard to output_dir for every
+            season, metric and top N instead of the winter gold table.
+        seasons (Sequence[str]): The seasons of the leaderboards.
+        metrics (Sequence[str]): The ranking metrics of the leaderboards.
+        tops (Sequence[int]): The numbers of countries of the leaderboards.
+        output_dir (str): The directory of the leaderboards.
+    """
+    columns = LEADERBOARD_COLUMNS if leaderboards else MEDAL_COLUMNS
+    with stage("load_table"):
+        df = load_table("olympic_stats.csv", columns=columns, thousands=",")
+        df_pop = load_table("world_population.csv", columns=POPULATION_COLUMNS)
+    aliases = {**ALIASES, **SUCCESSOR_ALIASES} if merge_successors else ALIASES
+    df, df_pop = prepare_data(df, df_pop, aliases)
+    if leaderboards:
+        timings = render_leaderboards(
+            df, df_pop, seasons, metrics, tops, output_dir, embed_assets
+        )
+        for name, seconds in timings.items():
+            logging.info("Rendered %s in %.1f ms", name, seconds * 1000)
+        logging.info(
+            "Rendered %d leaderboards in %.2f s", len(timings), sum(timings.values())
+        )
+        return
     df_geo = merge_data(df, df_pop)
-    df_geo = add_html(df_geo)
+    assets = AssetRegistry("images") if embed_assets else None
+    df_geo = add_html(df_geo, assets)
+    if writer == "lean":
+        with open_output(output) as f:
+            f.write(assets.style() if assets else "")
+            write_table(df_geo, f)
+        return
     df_result = style_table(df_geo)
-    html = HTML(df_result.to_html())
-    with open("result.html", "w") as f:
-        f.write(html.data)
+    with stage("to_html") as current:
+        current.result = df_result.to_html()
+    with open_output(output) as f:
+        f.write(assets.style() if assets else "")
+        f.write(current.result)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Who has the highest Winter Olympics medal count?"
+    )
+    parser.add_argument(
+        "--writer",
+        choices=("styler", "lean"),
+        default="styler",
+        help="Render the HTML with pandas Styler or the lean table writer",
+    )
+    parser.add_argument(
+        "--output",
+        default="result.html",
+        help='The file the HTML is written to, "-" for stdout',
+    )
+    parser.add_argument(
+        "--embed-assets",
+        action="store_true",
+        help="Embed the images once in the HTML instead of linking them",
+    )
+    parser.add_argument(
+        "--merge-successors",
+        action="store_true",
+        help="Count the medals of former countries for their successors",
+    )
+    parser.add_argument(
+        "--leaderboards",
+        action="store_true",
+        help="Write a leaderboard for every season, metric and top N",
+    )
+    parser.add_argument(
+        "--seasons",
+        nargs="+",
+        choices=SEASONS,
+        default=list(SEASONS),
+        help="The seasons of the leaderboards",
+    )
+    parser.add_argument(
+        "--metrics",
+        nargs="+",
+        choices=METRICS,
+        default=list(METRICS),
+        help="The ranking metrics of the leaderboards",
+    )
+    parser.add_argument(
+        "--tops",
+        nargs="+",
+        type=int,
+        default=[10],
+        help="The numbers of countries of the leaderboards",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="leaderboards",
+        help="The directory the leaderboards are written to",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(
+        writer=args.writer,
+        output=args.output,
+        embed_assets=args.embed_assets,
+        merge_successors=args.merge_successors,
+        leaderboards=args.leaderboards,
+        seasons=args.seasons,
+        metrics=args.metrics,
+        tops=args.tops,
+        output_dir=args.output_dir,
+    )
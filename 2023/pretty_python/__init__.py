@@ -0,0 +1,5 @@
+"""Helpers shared by the scripts of the 2023 gallery
+
+Every chart lives in its own directory and is run from there, so the scripts
+add the `2023` directory to `sys.path` before importing from this package
+"""
@@ -0,0 +1,143 @@
+"""Embed the images of a report once instead of linking them in every cell
+
+The reports repeat the same few images in every row: the arrows of the W13
+deltas, the medals of W14, the squares of the waffle calendar. Linking them
+with `<img src=...>` repeats the markup in every cell and costs the browser a
+request per file, and embedding them in every cell as a data URI would blow
+up the size of the document
+
+An `AssetRegistry` turns every image into a CSS class with the image as a
+data URI background. The cells only refer to the class, e.g.
+`<span class="asset-Gold" style="width: 20px"></span>`, and the registry
+writes one rule per image used in the document. The class keeps the aspect
+ratio of the image, so setting the width is enough, like for an `<img>`
+"""
+import base64
+import os
+import re
+import struct
+from functools import lru_cache
+from typing import Dict, NamedTuple, Tuple
+
+MIME_TYPES = {".svg": "image/svg+xml", ".png": "image/png"}
+
+
+class Asset(NamedTuple):
+    """An image read from disk"""
+
+    data_uri: str
+    width: float
+    height: float
+
+
+def _svg_size(svg: str) -> Tuple[float, float]:
+    """The size of an SVG from the width and height of its root, or its viewBox"""
+    root = svg[svg.index("<svg") : svg.index(">", svg.index("<svg"))]
+    width = re.search(r'\swidth="([\d.]+)(?:px)?"', root)
+    height = re.search(r'\sheight="([\d.]+)(?:px)?"', root)
+    if width and height:
+        return float(width.group(1)), float(height.group(1))
+    view_box = re.search(r'viewBox="([^"]*)"', root).group(1)
+    _, _, width, height = view_box.replace(",", " ").split()
+    return float(width), float(height)
+
+
+def _png_size(data: bytes) -> Tuple[float, float]:
+    """The size of a PNG from its IHDR chunk"""
+    width, height = struct.unpack(">II", data[16:24])
+    return float(width), float(height)
+
+
+@lru_cache(maxsize=None)
+def load_asset(path: str) -> Asset:
+    """Read an image once per process
+
+    Args:
+        path: The path of an SVG or PNG file
+
+    Returns:
+        The image as a data URI, with its intrinsic size
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, "rb") as f:
+        data = f.read()
+    if extension == ".svg":
+        width, height = _svg_size(data.decode("utf-8", errors="replace"))
+    else:
+        width, height = _png_size(data)
+    encoded = base64.b64encode(data).decode("ascii")
+    return Asset(f"data:{MIME_TYPES[extension]};base64,{encoded}", width, height)
+
+
+def class_name(name: str, prefix: str = "asset") -> str:
+    """The CSS class of an image, e.g. "asset-Gold" for "Gold.png"
+
+    Args:
+        name: The file name of the image
+        prefix: The prefix of the class
+
+    Returns:
+        The name of the class
+    """
+    stem = os.path.splitext(name)[0]
+    return f"{prefix}-{re.sub(r'[^A-Za-z0-9_-]', '-', stem)}"
+
+
+class AssetRegistry:
+    """The images used by one document, each embedded once as a CSS class
+
+    Args:
+        directory: The directory the images are read from
+        prefix: The prefix of the classes
+    """
+
+    def __init__(self, directory: str = "images", prefix: str = "asset"):
+        self.directory = directory
+        self.prefix = prefix
+        self.used: Dict[str, str] = {}
+
+    def use(self, name: str) -> str:
+        """Register an image used by the document
+
+        Args:
+            name: The file name of the image in `directory`
+
+        Returns:
+            The CSS class the cells use to show the image
+        """
+        if name not in self.used:
+            load_asset(os.path.join(self.directory, name))
+            self.used[name] = class_name(name, self.prefix)
+        return self.used[name]
+
+    def css(self) -> str:
+        """Build one CSS rule for every image used
+
+        The image is stretched over the content box of the element, the way
+        an `<img>` is drawn inside its padding
+
+        Returns:
+            The CSS rules
+        """
+        rules = []
+        for name, css_class in self.used.items():
+            asset = load_asset(os.path.join(self.directory, name))
+            rules.append(
+                f".{css_class} {{\n"
+                "  display: inline-block;\n"
+                f"  aspect-ratio: {asset.width:g} / {asset.height:g};\n"
+                f'  background: url("{asset.data_uri}") center / 100% 100% '
+                "no-repeat content-box;\n"
+                "}\n"
+            )
+        return "".join(rules)
+
+    def style(self) -> str:
+        """Build the <style> element of the images used
+
+        Returns:
+            The <style> element, empty if no image is used
+        """
+        if not self.used:
+            return ""
+        return f'<style type="text/css">\n{self.css()}</style>\n'
@@ -0,0 +1,569 @@
+"""Benchmark the stages of the chart pipelines on synthetic data
+
+The shipped datasets are tiny, so they don't show how the pipelines scale.
+The generators below make copies of them 10, 100 or 10,000 times as large:
+more tickers over the same years for W13, more countries for W14, more
+cities for the Day02 calendars and more transfers over the same years for
+Day05. The data of Day01, Day03 and Day04 is inline and doesn't scale, only
+the export of their chart is measured, at the smallest scale. Every stage is
+timed on its own, on data generated beforehand and
+after a warm-up run, and its peak memory is measured with `tracemalloc` in a
+separate run
+
+Stages that go through matplotlib or pandas Styler are skipped above the
+scale they can finish in reasonable time. Each run is appended to a JSON
+lines history together with the commit, so regressions can be compared
+across commits. Run from `2023/`:
+
+    python -m pretty_python.benchmark --scales 10 100 10000
+    python -m pretty_python.benchmark --charts W14 --scales 10 --compare
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from types import ModuleType
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pretty_python.build import CHARTS, ROOT
+from pretty_python.export import export_figure
+from pretty_python.trend import update_trend
+
+SCALES = (10, 100, 10000)
+
+HISTORY_FILE = os.path.join(ROOT, ".benchmarks.jsonl")
+
+# Stages slower than this factor compared to the previous run are reported
+REGRESSION_THRESHOLD = 1.1
+
+
+class Stage(NamedTuple):
+    """A stage of a chart pipeline
+
+    `data` generates the input of the stage for a scale and `run` runs the
+    stage on it with the module of the chart. Only `run` is timed
+    """
+
+    chart: str
+    name: str
+    data: Callable[[int], object]
+    run: Callable[[ModuleType, object], object]
+    max_scale: int = max(SCALES)
+
+
+_modules: Dict[str, ModuleType] = {}
+
+
+def load_chart(name: str) -> ModuleType:
+    """Import the script of a chart without running `main`
+
+    Args:
+        name: The name of the chart, see `build.CHARTS`
+
+    Returns:
+        The module of the script
+    """
+    if name not in _modules:
+        chart = CHARTS[name]
+        directory = os.path.join(ROOT, chart.directory)
+        # For modules next to the script, like `sparklines.py`
+        sys.path.insert(0, directory)
+        spec = importlib.util.spec_from_file_location(
+            f"chart_{name}", os.path.join(directory, chart.script)
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[name] = module
+    return _modules[name]
+
+
+@contextlib.contextmanager
+def chart_workdir(name: str) -> Iterator[str]:
+    """Work in a temporary copy of a chart directory
+
+    The stages read their template and images, copied from the files among
+    the inputs of the chart, and write their outputs relative to the working
+    directory, so the files of the chart itself are never touched
+
+    Args:
+        name: The name of the chart
+
+    Yields:
+        The path of the temporary directory
+    """
+    directory = os.path.join(ROOT, CHARTS[name].directory)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "graphs"))
+        os.makedirs(os.path.join(workdir, "images"))
+        for path in CHARTS[name].inputs:
+            if os.path.isfile(os.path.join(directory, path)):
+                shutil.copy(os.path.join(directory, path), os.path.join(workdir, path))
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(cwd)
+
+
+def replicate(
+    df: pd.DataFrame,
+    scale: int,
+    keys: Sequence[str],
+    numbers: Sequence[str],
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Make a dataset `scale` times as large out of copies of a small one
+
+    Every copy gets its own keys, e.g. "AAPL" becomes "AAPL 3", and its
+    numbers are multiplied by a random factor between 0.5 and 1.5
+
+    Args:
+        df: The dataset to copy
+        scale: The number of copies
+        keys: The columns identifying a row, like the ticker or the country
+        numbers: The integer columns that get random variations
+        seed: The seed of the random factors
+
+    Returns:
+        The synthetic dataset
+    """
+    rng = np.random.default_rng(seed)
+    copies = np.repeat(np.arange(scale), len(df))
+    df_scaled = pd.concat([df] * scale, ignore_index=True)
+    for key in keys:
+        df_scaled[key] = df_scaled[key].astype(str) + " " + copies.astype(str)
+    for column in numbers:
+        factor = rng.uniform(0.5, 1.5, len(df_scaled))
+        df_scaled[column] = (df_scaled[column].to_numpy() * factor).astype(np.int64)
+    return df_scaled
+
+
+def synthetic_employees(scale: int) -> pd.DataFrame:
+    """Tickers x years: W13's data.csv with `scale` times as many tickers"""
+    m = load_chart("W13")
+    path = os.path.join(ROOT, CHARTS["W13"].directory, "data.csv")
+    # Read in chunks, which doesn't write a Feather file next to the CSV
+    df = m.read_employees(path, chunksize=1000)
+    return replicate(df, scale, ["Ticker", "Company"], ["Number"])
+
+
+def synthetic_medals(scale: int) -> pd.DataFrame:
+    """Countries x medals: W14's merged table with `scale` times as many countries"""
+    m = load_chart("W14")
+    directory = os.path.join(ROOT, CHARTS["W14"].directory)
+    df = pd.read_csv(
+        os.path.join(directory, "olympic_stats.csv"),
+        usecols=m.MEDAL_COLUMNS,
+        thousands=",",
+    )[m.MEDAL_COLUMNS]
+    df_pop = pd.read_csv(
+        os.path.join(directory, "world_population.csv"), usecols=m.POPULATION_COLUMNS
+    )[m.POPULATION_COLUMNS]
+    df_geo = m.merge_data(*m.prepare_data(df, df_pop))
+    medals = ["winter_gold", "winter_silver", "winter_bronze"]
+    df_scaled = replicate(df_geo, scale, ["country"], medals + ["2022 Population"])
+    df_scaled["winter_total"] = df_scaled[medals].sum(axis=1)
+    return df_scaled
+
+
+def synthetic_calendars(scale: int) -> pd.DataFrame:
+    """Days x cities: the Day02 calendar stacked once for each of `scale` cities"""
+    m = load_chart("Day02")
+    df_pivot = m.calendar_grid(pd.DataFrame(m.DATA))
+    return pd.concat([df_pivot] * scale, ignore_index=True)
+
+
+def synthetic_forecast(scale: int) -> pd.DataFrame:
+    """Days x cities: the Day02 forecast as a long table for `scale` cities"""
+    m = load_chart("Day02")
+    df = pd.DataFrame(m.DATA)
+    dates = pd.to_datetime("2023-04-" + df["day"].astype(str))
+    df = df.assign(city="City", date=dates)
+    return replicate(df[m.FORECAST_COLUMNS], scale, ["city"], ["low", "high"])
+
+
+def synthetic_transfers(scale: int) -> pd.DataFrame:
+    """Transfers x years: Day05's records with `scale` times as many transfers"""
+    path = os.path.join(ROOT, CHARTS["Day05"].directory, "transfer_records.csv")
+    df = pd.read_csv(path, usecols=["year", "value_gbp"])
+    return replicate(df, scale, [], ["value_gbp"])
+
+
+def employee_table(scale: int) -> pd.DataFrame:
+    """The W13 summary table of `synthetic_employees`"""
+    return load_chart("W13").produce_table(synthetic_employees(scale))
+
+
+def medal_table(scale: int) -> pd.DataFrame:
+    """The W14 table with HTML cells of `synthetic_medals`"""
+    return load_chart("W14").add_html(synthetic_medals(scale))
+
+
+def transfers_figure(scale: int):
+    """The Day05 chart of `synthetic_transfers`, drawn but not saved"""
+    df = synthetic_transfers(scale)
+    return load_chart("Day05").plot_chart(df[df["year"] >= 1980], "benchmark")
+
+
+def oil_reserves_figure(scale: int):
+    """The Day01 chart, drawn but not saved"""
+    m = load_chart("Day01")
+    df = pd.DataFrame(m.DATA).sort_values(by="reserves_bbl", ascending=False)
+    return m.plot_oil_reserves_between_opec_countries(df)
+
+
+def fauna_figure(scale: int):
+    """The Day03 chart, drawn but not saved"""
+    m = load_chart("Day03")
+    return m.style_plot(pd.DataFrame(m.DATA).melt(id_vars="period"))
+
+
+def flights_figure(scale: int):
+    """The Day04 chart, drawn but not saved"""
+    m = load_chart("Day04")
+    return m.plot_chart(pd.DataFrame(m.DATA))
+
+
+def _produce_summaries(m: ModuleType, df: pd.DataFrame) -> None:
+    """The original per-ticker loop, with the sparklines written as SVG"""
+    with m.RENDERERS["svg"](None) as renderer:
+        for ticker, df_ticker in df.groupby("Ticker"):
+            m.produce_summary(df_ticker.copy(), ticker, renderer, "inline")
+
+
+def _plot_sparklines(m: ModuleType, df: pd.DataFrame) -> None:
+    """The original sparklines, a new matplotlib figure for every ticker"""
+    for ticker, df_ticker in df.groupby("Ticker"):
+        m.plot_sparklines(df_ticker.copy(), ticker)
+
+
+def _draw_transfers(
+    m: ModuleType, df: pd.DataFrame, density: Optional[str] = None
+) -> None:
+    """Draw the Day05 transfers, as markers or binned, without saving them"""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    if density is None:
+        m.plot_markers(df)
+    else:
+        m.plot_density(ax, df, density)
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+STAGES = [
+    # The exports of the charts with inline data, without the cache of the
+    # tight bounding box
+    Stage(
+        "Day01",
+        "savefig",
+        oil_reserves_figure,
+        lambda m, fig: export_figure(
+            fig, "oil_reserves.png", cache_file=None, facecolor="#f4f0e8"
+        ),
+        min(SCALES),
+    ),
+    Stage(
+        "Day03",
+        "savefig",
+        fauna_figure,
+        lambda m, fig: export_figure(
+            fig, "images/fauna.png", cache_file=None, transparent=True
+        ),
+        min(SCALES),
+    ),
+    Stage(
+        "Day04",
+        "savefig",
+        flights_figure,
+        lambda m, fig: export_figure(fig, "images/historical.png", cache_file=None),
+        min(SCALES),
+    ),
+    Stage("W13", "produce_summary", synthetic_employees, _produce_summaries, 100),
+    Stage(
+        "W13",
+        "produce_table",
+        synthetic_employees,
+        lambda m, df: m.produce_table(df),
+    ),
+    Stage("W13", "plot_sparklines", synthetic_employees, _plot_sparklines, 10),
+    Stage(
+        "W13",
+        "render_sparklines",
+        synthetic_employees,
+        lambda m, df: m.render_sparklines(df),
+        10,
+    ),
+    Stage(
+        "W13",
+        "render_sparklines_svg",
+        synthetic_employees,
+        lambda m, df: m.render_sparklines(df, None, backend="svg"),
+        100,
+    ),
+    Stage(
+        "W13",
+        "style_table",
+        employee_table,
+        lambda m, df: m.style_table(df).to_html(),
+        100,
+    ),
+    Stage(
+        "W13",
+        "write_table",
+        employee_table,
+        lambda m, df: m.write_table(df, io.StringIO()),
+    ),
+    Stage("W14", "add_html", synthetic_medals, lambda m, df: m.add_html(df.copy())),
+    Stage(
+        "W14",
+        "style_table",
+        medal_table,
+        lambda m, df: m.style_table(df).to_html(),
+        100,
+    ),
+    Stage(
+        "W14",
+        "write_table",
+        medal_table,
+        lambda m, df: m.write_table(df, io.StringIO()),
+    ),
+    Stage(
+        "Day02",
+        "style_cell",
+        synthetic_calendars,
+        lambda m, df: df.applymap(m.style_cell),
+        100,
+    ),
+    Stage("Day02", "style_grid", synthetic_calendars, lambda m, df: m.style_grid(df)),
+    Stage(
+        "Day02",
+        "style_table",
+        synthetic_calendars,
+        lambda m, df: m.style_table(df).to_html(),
+        100,
+    ),
+    Stage(
+        "Day02",
+        "render_calendars",
+        synthetic_forecast,
+        lambda m, df: m.render_calendars(df, "calendars"),
+        100,
+    ),
+    Stage(
+        "Day05",
+        "polyfit",
+        synthetic_transfers,
+        lambda m, df: np.polyfit(df["year"], df["value_gbp"], 3),
+    ),
+    # The same fit from the sums of the normal equations, over all rows
+    Stage(
+        "Day05",
+        "update_trend",
+        synthetic_transfers,
+        lambda m, df: update_trend(df["year"], df["value_gbp"], 3, state_file=None),
+    ),
+    Stage("Day05", "plot_markers", synthetic_transfers, _draw_transfers, 100),
+    Stage(
+        "Day05",
+        "plot_density_hexbin",
+        synthetic_transfers,
+        lambda m, df: _draw_transfers(m, df, "hexbin"),
+    ),
+    Stage(
+        "Day05",
+        "plot_density_hist2d",
+        synthetic_transfers,
+        lambda m, df: _draw_transfers(m, df, "hist2d"),
+    ),
+    # Only the export, without the cache of the tight bounding box
+    Stage(
+        "Day05",
+        "savefig",
+        transfers_figure,
+        lambda m, fig: export_figure(fig, "images/slopes.png", cache_file=None),
+        100,
+    ),
+]
+
+
+def measure(run: Callable[[], object], repeat: int = 3) -> Dict[str, float]:
+    """Time a stage and measure its peak memory
+
+    Args:
+        run: The stage, ready to run
+        repeat: The number of timed runs, the fastest one is kept
+
+    Returns:
+        The time in seconds and the peak memory allocated in MB
+    """
+    # A first run pays for lazy imports and caches, it isn't measured
+    run()
+    # Measured in its own run, tracing the allocations slows the stage down
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return {"seconds": min(times), "peak_mb": peak / 2**20}
+
+
+def run_benchmarks(
+    charts: Sequence[str], scales: Sequence[int], repeat: int = 3
+) -> List[Dict]:
+    """Run the stages of some charts at every scale
+
+    Args:
+        charts: The names of the charts
+        scales: How many times larger than the shipped data the inputs are
+        repeat: The number of timed runs of every stage
+
+    Returns:
+        One result per chart, stage and scale
+    """
+    import matplotlib
+
+    # The stages save their figures, they are never shown
+    matplotlib.use("Agg")
+    results = []
+    for stage in STAGES:
+        if stage.chart not in charts:
+            continue
+        m = load_chart(stage.chart)
+        for scale in scales:
+            if scale > stage.max_scale:
+                print(f"{stage.chart:6} {stage.name:22} {scale:>6}x  skipped")
+                continue
+            with chart_workdir(stage.chart):
+                data = stage.data(scale)
+                # Quiet the progress messages of the stages
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = measure(lambda: stage.run(m, data), repeat)
+            results.append(
+                {"chart": stage.chart, "stage": stage.name, "scale": scale, **result}
+            )
+            print(
+                f"{stage.chart:6} {stage.name:22} {scale:>6}x "
+                f"{result['seconds'] * 1000:10.1f} ms {result['peak_mb']:8.1f} MB"
+            )
+    return results
+
+
+def read_history(path: str = HISTORY_FILE) -> List[Dict]:
+    """Read the previous runs from a JSON lines history"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(results: List[Dict], path: str = HISTORY_FILE) -> Dict:
+    """Append a run to the history, with the commit and versions it ran on
+
+    Args:
+        results: The results of `run_benchmarks`
+        path: The path of the history
+
+    Returns:
+        The record written
+    """
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    ).stdout.strip()
+    record = {
+        "commit": commit or None,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "results": results,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return record
+
+
+def compare(history: List[Dict], results: List[Dict]) -> List[str]:
+    """Find the stages that got slower since they were last measured
+
+    Args:
+        history: The previous runs, oldest first
+        results: The results of the current run
+
+    Returns:
+        A line for every stage slower than REGRESSION_THRESHOLD times before
+    """
+    before = {}
+    for record in history:
+        for result in record["results"]:
+            key = (result["chart"], result["stage"], result["scale"])
+            before[key] = (record["commit"], result["seconds"])
+    regressions = []
+    for result in results:
+        key = (result["chart"], result["stage"], result["scale"])
+        if key not in before:
+            continue
+        commit, seconds = before[key]
+        if result["seconds"] > REGRESSION_THRESHOLD * seconds:
+            regressions.append(
+                f"{result['chart']} {result['stage']} {result['scale']}x: "
+                f"{seconds * 1000:.1f} ms at {commit} -> "
+                f"{result['seconds'] * 1000:.1f} ms"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the chart pipelines on synthetic data"
+    )
+    parser.add_argument(
+        "--charts",
+        nargs="+",
+        choices=sorted({stage.chart for stage in STAGES}),
+        default=sorted({stage.chart for stage in STAGES}),
+    )
+    parser.add_argument("--scales", nargs="+", type=int, default=list(SCALES))
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed runs of every stage"
+    )
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Report the stages slower than when they were last measured",
+    )
+    parser.add_argument(
+        "--no-save", action="store_true", help="Don't append to the history"
+    )
+    args = parser.parse_args()
+    history = read_history(args.history)
+    results = run_benchmarks(args.charts, args.scales, args.repeat)
+    if not args.no_save:
+        append_history(results, args.history)
+    if args.compare:
+        regressions = compare(history, results)
+        for line in regressions:
+            print(f"slower: {line}")
+        sys.exit(1 if regressions else 0)
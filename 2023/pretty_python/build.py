@@ -0,0 +1,303 @@
+"""Rebuild the charts of the gallery whose inputs changed
+
+Every chart is made by running its script from its own directory. This keeps
+a hash of everything a chart depends on: the script with its inline data,
+the local modules and `pretty_python` modules it imports, and its data files,
+templates and images. Only the charts whose inputs changed since their last
+build, or whose outputs are missing or were modified, are run again. The
+charts don't depend on each other, so they are run in parallel. Run from
+`2023/`:
+
+    python -m pretty_python.build            # rebuild the stale charts
+    python -m pretty_python.build W14 --force
+    python -m pretty_python.build --dry-run  # only list the stale charts
+
+The hashes are kept in `.build-state.json`
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Set
+
+# The directory of the gallery, with the charts and `pretty_python`
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATE_FILE = os.path.join(ROOT, ".build-state.json")
+
+
+class Chart(NamedTuple):
+    """A chart of the gallery
+
+    The inputs and outputs are relative to the directory of the chart and
+    can be files or directories. The modules imported by the script don't
+    need to be listed, they are found by `imported_files`
+    """
+
+    directory: str
+    script: str
+    inputs: Sequence[str]
+    outputs: Sequence[str]
+
+
+CHARTS = {
+    "W13": Chart(
+        "W13",
+        "number-of-employees.py",
+        ["data.csv", "html_template.tpl", "images"],
+        ["result.html", "graphs"],
+    ),
+    "W14": Chart(
+        "W14",
+        "olympic_stats.py",
+        ["olympic_stats.csv", "world_population.csv", "html_template.tpl", "images"],
+        ["result.html"],
+    ),
+    "Day01": Chart(
+        "30DayChartChallenge/Day01-part-to-whole",
+        "opec_countries_oil_reserves.py",
+        ["oil-pump.png"],
+        ["oil_reserves.png"],
+    ),
+    "Day02": Chart(
+        "30DayChartChallenge/Day02-waffle",
+        "waffle.py",
+        ["html_template.tpl", "images"],
+        ["result.html"],
+    ),
+    "Day03": Chart(
+        "30DayChartChallenge/Day03-fauna",
+        "fauna.py",
+        [],
+        ["images/fauna.png"],
+    ),
+    "Day04": Chart(
+        "30DayChartChallenge/Day04-historical",
+        "historical.py",
+        ["images/coronavirus.png"],
+        ["images/historical.png"],
+    ),
+    "Day05": Chart(
+        "30DayChartChallenge/Day05-slopes",
+        "slopes.py",
+        ["transfer_records.csv"],
+        ["images/slopes.png"],
+    ),
+}
+
+
+def _files(path: str) -> Iterator[str]:
+    """The files at a path, every file below it for a directory"""
+    if os.path.isdir(path):
+        for directory, _, names in sorted(os.walk(path)):
+            for name in sorted(names):
+                yield os.path.join(directory, name)
+    elif os.path.exists(path):
+        yield path
+
+
+def _hash_file(path: str) -> str:
+    """The SHA-256 of the content of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def imported_files(script: str, seen: Optional[Set[str]] = None) -> Set[str]:
+    """Find the local modules imported by a script, and the ones they import
+
+    A module is local if it's next to the script, like `sparklines.py` in
+    W13, or part of `pretty_python`
+
+    Args:
+        script: The path of the script
+        seen: The files found so far
+
+    Returns:
+        The paths of the script and of every local module it depends on
+    """
+    seen = set() if seen is None else seen
+    seen.add(script)
+    with open(script) as f:
+        tree = ast.parse(f.read(), filename=script)
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    for name in names:
+        for base in (os.path.dirname(script), ROOT):
+            path = os.path.join(base, *name.split(".")) + ".py"
+            if os.path.exists(path) and path not in seen:
+                imported_files(path, seen)
+    return seen
+
+
+def input_hash(chart: Chart) -> str:
+    """Hash everything a chart depends on
+
+    Args:
+        chart: The chart
+
+    Returns:
+        The SHA-256 of the names and contents of all the inputs
+    """
+    directory = os.path.join(ROOT, chart.directory)
+    paths = imported_files(os.path.join(directory, chart.script))
+    for name in chart.inputs:
+        paths.update(_files(os.path.join(directory, name)))
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.relpath(path, ROOT).encode())
+        digest.update(_hash_file(path).encode())
+    return digest.hexdigest()
+
+
+def output_hashes(chart: Chart) -> Dict[str, str]:
+    """Hash the outputs of a chart
+
+    Args:
+        chart: The chart
+
+    Returns:
+        The SHA-256 of every output file, by path relative to the gallery
+    """
+    directory = os.path.join(ROOT, chart.directory)
+    return {
+        os.path.relpath(path, ROOT): _hash_file(path)
+        for name in chart.outputs
+        for path in _files(os.path.join(directory, name))
+    }
+
+
+def is_stale(chart: Chart, state: Dict) -> bool:
+    """Check whether a chart needs to be built again
+
+    Args:
+        chart: The chart
+        state: The hashes recorded after the last build of the chart
+
+    Returns:
+        Whether the inputs changed or the outputs are missing or modified
+    """
+    if not state or state["inputs"] != input_hash(chart):
+        return True
+    directory = os.path.join(ROOT, chart.directory)
+    paths = [os.path.join(directory, name) for name in chart.outputs]
+    if not all(os.path.exists(path) for path in paths):
+        return True
+    return state["outputs"] != output_hashes(chart)
+
+
+def build_chart(chart: Chart) -> float:
+    """Run the script of a chart from its directory
+
+    Args:
+        chart: The chart
+
+    Returns:
+        The time the build took in seconds
+    """
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, chart.script],
+        cwd=os.path.join(ROOT, chart.directory),
+        env={**os.environ, "MPLBACKEND": "Agg"},
+        capture_output=True,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def read_state() -> Dict:
+    """Read the hashes recorded by the previous builds"""
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+
+def write_state(state: Dict) -> None:
+    """Record the hashes of the charts built"""
+    with open(STATE_FILE, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def build(
+    names: Sequence[str], jobs: Optional[int] = None, force: bool = False
+) -> List[str]:
+    """Build the stale charts in parallel
+
+    Args:
+        names: The charts to consider, see `CHARTS`
+        jobs: The number of charts built at once, the number of CPUs if None
+        force: Build the charts even if they are up to date
+
+    Returns:
+        The names of the charts that failed to build
+    """
+    state = read_state()
+    stale = [
+        name for name in names if force or is_stale(CHARTS[name], state.get(name))
+    ]
+    for name in names:
+        if name not in stale:
+            print(f"{name}: up to date")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        futures = {name: executor.submit(build_chart, CHARTS[name]) for name in stale}
+        for name, future in futures.items():
+            try:
+                seconds = future.result()
+            except subprocess.CalledProcessError as error:
+                failed.append(name)
+                print(f"{name}: failed\n{error.stderr.decode(errors='replace')}")
+                continue
+            state[name] = {
+                "inputs": input_hash(CHARTS[name]),
+                "outputs": output_hashes(CHARTS[name]),
+            }
+            print(f"{name}: built in {seconds:.1f} s")
+    write_state(state)
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild the charts of the gallery whose inputs changed"
+    )
+    parser.add_argument(
+        "charts",
+        nargs="*",
+        help=f"The charts to build, all of them by default: {', '.join(CHARTS)}",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of charts built at once"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Build even the up to date charts"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only list the stale charts"
+    )
+    args = parser.parse_args()
+    charts = args.charts or list(CHARTS)
+    unknown = [name for name in charts if name not in CHARTS]
+    if unknown:
+        parser.error(f"unknown charts: {', '.join(unknown)}")
+    if args.dry_run:
+        state = read_state()
+        for name in charts:
+            stale = args.force or is_stale(CHARTS[name], state.get(name))
+            print(f"{name}: {'stale' if stale else 'up to date'}")
+        sys.exit(0)
+    sys.exit(1 if build(charts, args.jobs, args.force) else 0)
@@ -0,0 +1,76 @@
+"""Build HTML table cells a column at a time
+
+Building the HTML of every cell with `df.apply(..., axis=1)` creates a Series
+for every row and formats the f-string over and over. A `CellTemplate` is
+parsed once into its literal text and its fields. Rendering it formats every
+field for the whole column at once and joins the pieces with vectorized
+string concatenation
+"""
+from string import Formatter
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+Column = Union[pd.Series, np.ndarray, list, str, int, float]
+
+
+def _as_text(values: Column, size: int) -> np.ndarray:
+    """Convert a column, or a scalar repeated `size` times, to text
+
+    Numbers are converted the same way an f-string would show them
+    """
+    if np.isscalar(values):
+        return np.full(size, str(values), dtype=object)
+    values = np.asarray(values)
+    if values.dtype.kind in "biuf":
+        return values.astype(str).astype(object)
+    return np.array([str(value) for value in values], dtype=object)
+
+
+class CellTemplate:
+    """An HTML template rendered for a whole column at once
+
+    The template uses the `str.format` syntax with named fields only, e.g.
+    `'<img width={width}px src="images/{name}.svg"/>'`. Format specs and
+    conversions aren't supported, the values should be computed beforehand
+
+    Args:
+        template: The HTML of a single cell
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError(f"Unsupported field in template: {field}")
+            self.parts.append((literal, field))
+
+    @property
+    def fields(self) -> List[str]:
+        """The names of the fields used by the template"""
+        return [field for _, field in self.parts if field is not None]
+
+    def render(self, size: Optional[int] = None, **columns: Column) -> np.ndarray:
+        """Render the template for every row
+
+        Args:
+            size: The number of rows, only needed when every value is a scalar
+            **columns: The values of every field, as columns or scalars
+
+        Returns:
+            An object array with the HTML of every cell
+        """
+        if size is None:
+            size = max(
+                (len(values) for values in columns.values() if not np.isscalar(values)),
+                default=1,
+            )
+        cells = np.full(size, "", dtype=object)
+        for literal, field in self.parts:
+            if literal:
+                cells = cells + literal
+            if field is not None:
+                cells = cells + _as_text(columns[field], size)
+        return cells
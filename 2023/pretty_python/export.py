@@ -0,0 +1,222 @@
+"""Save the PNG charts at several resolutions from a single draw
+
+`plt.savefig(path, dpi=300, bbox_inches="tight")` lays the whole figure out
+once just to measure its extent before drawing it, and every other size of
+the chart means running the script again. `export_figure` keeps the tight
+bounding box of a figure in a cache file, keyed by what decides its layout,
+so the measuring pass only happens when the layout changes. The figure is
+then drawn once at the highest resolution asked for, and the smaller sizes,
+e.g. the thumbnails of the gallery, are scaled down from that image:
+
+    export_figure(fig, "images/slopes.png", sizes=("print", "web", "thumbnail"))
+
+writes `images/slopes.png`, `images/slopes-web.png` and
+`images/slopes-thumbnail.png`. The print size is the same image `savefig`
+writes
+"""
+import hashlib
+import io
+import json
+import os
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Sequence
+
+import matplotlib
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+from matplotlib.image import imsave
+from matplotlib.text import Text
+from matplotlib.transforms import Bbox
+
+# The resolution of every size of a chart, in dots per inch
+RESOLUTIONS = {"print": 300, "web": 100, "thumbnail": 30}
+
+# The tight bounding boxes measured so far, in the directory of the chart
+CACHE_FILE = ".export-cache.json"
+
+
+def output_path(path: str, size: str) -> str:
+    """The file a size of a chart is written to
+
+    Args:
+        path: The file of the print size, e.g. "images/slopes.png"
+        size: The size, see `RESOLUTIONS`
+
+    Returns:
+        The path itself for the print size, "images/slopes-web.png" otherwise
+    """
+    if size == "print":
+        return path
+    stem, extension = os.path.splitext(path)
+    return f"{stem}-{size}{extension}"
+
+
+def _artist_layout(artist: Artist) -> List:
+    """What decides where an artist is drawn and how much room it takes"""
+    layout = [type(artist).__name__, artist.get_visible()]
+    if isinstance(artist, Text):
+        layout += [
+            artist.get_text(),
+            artist.get_position(),
+            artist.get_fontsize(),
+            artist.get_fontfamily(),
+            artist.get_rotation(),
+        ]
+    if isinstance(artist, Axes):
+        layout += [
+            artist.get_position().bounds,
+            artist.get_xlim(),
+            artist.get_ylim(),
+        ]
+    # Annotations and annotation boxes point at xy, boxes sit at xybox
+    for name in ("xy", "xybox"):
+        layout.append(getattr(artist, name, None))
+    return layout
+
+
+def layout_key(fig: Figure, dpi: float, pad_inches: float) -> str:
+    """Fingerprint the layout of a figure without drawing it
+
+    Covers the size of the figure, the position and limits of the axes, the
+    text, position and font of every text and the anchors of annotations.
+    Anything else that moves the extent of a chart, like markers drawn
+    outside the axes, needs the cache file to be removed
+
+    Args:
+        fig: The figure
+        dpi: The resolution the figure is drawn at
+        pad_inches: The padding around the tight bounding box
+
+    Returns:
+        The SHA-256 of the layout
+    """
+    layout = [
+        matplotlib.__version__,
+        fig.get_size_inches().tolist(),
+        dpi,
+        pad_inches,
+        [_artist_layout(artist) for artist in fig.findobj()],
+    ]
+    return hashlib.sha256(repr(layout).encode()).hexdigest()
+
+
+def tight_bbox(fig: Figure, dpi: float, pad_inches: float) -> Bbox:
+    """Measure the tight bounding box of a figure the way `savefig` does
+
+    Args:
+        fig: The figure
+        dpi: The resolution the figure is drawn at
+        pad_inches: The padding around the extent of the artists
+
+    Returns:
+        The bounding box in inches
+    """
+    from matplotlib.backends.backend_agg import RendererAgg
+
+    original_dpi = fig.dpi
+    fig.dpi = dpi
+    try:
+        renderer = RendererAgg(int(fig.bbox.width), int(fig.bbox.height), dpi)
+        # Lays the figure out without rasterizing anything
+        with getattr(renderer, "_draw_disabled", nullcontext)():
+            fig.draw(renderer)
+        return fig.get_tightbbox(renderer).padded(pad_inches)
+    finally:
+        fig.dpi = original_dpi
+
+
+def cached_tight_bbox(
+    fig: Figure, dpi: float, pad_inches: float, cache_file: Optional[str] = CACHE_FILE
+) -> Bbox:
+    """Look up the tight bounding box of a figure, measuring it on a miss
+
+    Args:
+        fig: The figure
+        dpi: The resolution the figure is drawn at
+        pad_inches: The padding around the extent of the artists
+        cache_file: The JSON file the boxes are kept in, None to always measure
+
+    Returns:
+        The bounding box in inches
+    """
+    if cache_file is None:
+        return tight_bbox(fig, dpi, pad_inches)
+    cache = {}
+    if os.path.exists(cache_file):
+        with open(cache_file) as f:
+            cache = json.load(f)
+    key = layout_key(fig, dpi, pad_inches)
+    if key in cache:
+        return Bbox(cache[key])
+    bbox = tight_bbox(fig, dpi, pad_inches)
+    cache[key] = bbox.get_points().tolist()
+    with open(cache_file, "w") as f:
+        json.dump(cache, f, indent=2)
+    return bbox
+
+
+def export_figure(
+    fig: Figure,
+    path: str,
+    sizes: Sequence[str] = ("print",),
+    pad_inches: Optional[float] = None,
+    cache_file: Optional[str] = CACHE_FILE,
+    **savefig_kwargs,
+) -> Dict[str, str]:
+    """Save a figure cropped to its tight bounding box at several sizes
+
+    Args:
+        fig: The figure
+        path: The PNG file of the print size, the other sizes are written
+            next to it, see `output_path`
+        sizes: The sizes to write, see `RESOLUTIONS`
+        pad_inches: The padding around the chart, `savefig.pad_inches` if None
+        cache_file: The JSON file the bounding boxes are kept in, None to
+            measure the figure every time
+        **savefig_kwargs: Passed on to `savefig`, e.g. `facecolor`
+
+    Returns:
+        The files written, by size
+    """
+    from PIL import Image
+
+    if pad_inches is None:
+        pad_inches = matplotlib.rcParams["savefig.pad_inches"]
+    dpi = max(RESOLUTIONS[size] for size in sizes)
+    bbox = cached_tight_bbox(fig, dpi, pad_inches, cache_file)
+    paths = {size: output_path(path, size) for size in sizes}
+    if list(sizes) == ["print"]:
+        fig.savefig(path, dpi=dpi, bbox_inches=bbox, **savefig_kwargs)
+        return paths
+
+    # Drawn once into raw RGBA, then every size is encoded from that image
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="rgba", dpi=dpi, bbox_inches=bbox, **savefig_kwargs)
+    width, height = int(bbox.width * dpi), int(bbox.height * dpi)
+    rgba = np.frombuffer(buffer.getbuffer(), np.uint8).reshape(height, width, 4)
+    # Scaled with premultiplied alpha, so transparent charts keep clean edges
+    image = Image.fromarray(rgba).convert("RGBa")
+    for size, size_path in paths.items():
+        if RESOLUTIONS[size] == dpi:
+            # The same writer `savefig` uses for PNG files
+            imsave(size_path, rgba, format="png", dpi=dpi)
+            continue
+        factor = dpi / RESOLUTIONS[size]
+        if factor.is_integer():
+            # Averaging blocks of pixels is much cheaper than resampling
+            resized = image.reduce(int(factor))
+        else:
+            resized = image.resize(
+                (max(1, round(width / factor)), max(1, round(height / factor))),
+                Image.LANCZOS,
+                reducing_gap=2.0,
+            )
+        imsave(
+            size_path,
+            np.asarray(resized.convert("RGBA")),
+            format="png",
+            dpi=RESOLUTIONS[size],
+        )
+    return paths
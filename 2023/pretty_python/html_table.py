@@ -0,0 +1,284 @@
+"""Write HTML tables without going through pandas Styler
+
+Styler gives every cell its own id and CSS rule, so both the render time and
+the size of the output grow with rows x columns. `HtmlTable` takes the same
+configuration the scripts pass to Styler: the `CUSTOM_STYLE` table styles,
+the properties set per column with `set_properties`, the header styles given
+to `apply_index`, the caption, the table attributes and the custom template.
+The properties end up in one CSS rule per column and the rows are written
+straight to a file handle
+
+The selectors of the column rules are less specific than the table styles,
+just like the per-cell ids of Styler, so conflicting properties resolve the
+same way in both
+
+`HtmlTable.stream` writes a table from chunks of rows as they are produced,
+so large tables never have to be held in memory as a whole
+"""
+import io
+import sys
+import uuid
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+import numpy as np
+import pandas as pd
+
+# (subset of columns or None for all of them, CSS properties)
+Properties = List[Tuple[Optional[Sequence[str]], Dict[str, str]]]
+# Functions taking the column index and returning a CSS string for each column
+HeaderStyle = Callable[[pd.Index], Sequence[str]]
+
+
+def read_template(path: str) -> Tuple[str, str]:
+    """Read the HTML around the table in a custom Styler template
+
+    The templates of the charts extend `html_table.tpl` and override its
+    `table` block, calling `{{ super() }}` where the table goes
+
+    Args:
+        path: The path of the template
+
+    Returns:
+        The HTML before and after the table
+    """
+    with open(path) as f:
+        text = f.read()
+    start = text.index("{% block table %}") + len("{% block table %}")
+    end = text.index("{% endblock table %}")
+    before, after = text[start:end].split("{{ super() }}")
+    return before.lstrip("\n"), after
+
+
+@contextmanager
+def open_output(path: str) -> Iterator[TextIO]:
+    """Open the file a report is written to
+
+    Args:
+        path: The path of the file, "-" for stdout
+
+    Yields:
+        The opened file, stdout isn't closed afterwards
+    """
+    if path == "-":
+        yield sys.stdout
+        sys.stdout.flush()
+    else:
+        with open(path, "w") as f:
+            yield f
+
+
+def parse_css(css: str) -> Dict[str, str]:
+    """Parse CSS declarations, e.g. "color: blue; text-align: left"
+
+    Args:
+        css: The declarations separated by semicolons
+
+    Returns:
+        The properties and their values
+    """
+    properties = {}
+    for declaration in css.split(";"):
+        if ":" in declaration:
+            name, value = declaration.split(":", 1)
+            properties[name.strip()] = value.strip()
+    return properties
+
+
+def _declarations(properties: Dict[str, str]) -> str:
+    """Format properties as CSS declarations, one per line"""
+    return "".join(f"  {name}: {value};\n" for name, value in properties.items())
+
+
+def _as_text(values: pd.Series) -> np.ndarray:
+    """Format the values of a column the way Styler does by default"""
+    if pd.api.types.is_float_dtype(values):
+        return np.array([f"{value:.6f}" for value in values], dtype=object)
+    return values.astype(str).to_numpy(dtype=object)
+
+
+class HtmlTable:
+    """A lean HTML table writer configured like a Styler
+
+    Args:
+        table_styles: The styles passed to `set_table_styles`
+        properties: The (subset, properties) pairs passed to `set_properties`,
+            in the order they are applied
+        header_styles: The functions passed to `apply_index(..., axis=1)`
+        caption: The caption of the table
+        table_attributes: The attributes passed to `set_table_attributes`
+        template: The path of a custom template extending `html_table.tpl`
+        chunksize: The number of rows formatted at once
+    """
+
+    def __init__(
+        self,
+        table_styles: Sequence[Dict] = (),
+        properties: Properties = (),
+        header_styles: Sequence[HeaderStyle] = (),
+        caption: str = "",
+        table_attributes: str = "",
+        template: Optional[str] = None,
+        chunksize: int = 1000,
+    ):
+        self.table_styles = table_styles
+        self.properties = properties
+        self.header_styles = header_styles
+        self.caption = caption
+        self.table_attributes = table_attributes
+        self.before, self.after = read_template(template) if template else ("", "")
+        self.chunksize = chunksize
+        self.table_id = f"T_{uuid.uuid4().hex[:5]}"
+
+    def _column_properties(self, columns: pd.Index) -> List[Dict[str, str]]:
+        """Merge the properties of every column in the order they were set"""
+        merged = [{} for _ in columns]
+        for subset, properties in self.properties:
+            for i, column in enumerate(columns):
+                if subset is None or column in subset:
+                    merged[i].update(properties)
+        return merged
+
+    def _header_properties(self, columns: pd.Index) -> List[Dict[str, str]]:
+        """Evaluate the header styles for every column"""
+        merged = [{} for _ in columns]
+        for style in self.header_styles:
+            for i, css in enumerate(style(columns)):
+                merged[i].update(parse_css(css or ""))
+        return merged
+
+    def style(self, columns: pd.Index) -> str:
+        """Build the <style> element of the table
+
+        Args:
+            columns: The columns of the table
+
+        Returns:
+            The CSS of the table styles, followed by one rule per column for
+            the cells and one per column for the headers
+        """
+        css = ['<style type="text/css">\n']
+        for table_style in self.table_styles:
+            selectors = ", ".join(
+                f"#{self.table_id} {selector.strip()}"
+                for selector in table_style["selector"].split(",")
+            )
+            properties = dict(table_style["props"])
+            css.append(f"{selectors} {{\n{_declarations(properties)}}}\n")
+        for i, properties in enumerate(self._column_properties(columns)):
+            if properties:
+                css.append(
+                    f".{self.table_id} .c{i} {{\n{_declarations(properties)}}}\n"
+                )
+        for i, properties in enumerate(self._header_properties(columns)):
+            if properties:
+                css.append(
+                    f".{self.table_id} th.col{i} {{\n{_declarations(properties)}}}\n"
+                )
+        css.append("</style>\n")
+        return "".join(css)
+
+    def write_header(self, columns: pd.Index, f: TextIO) -> None:
+        """Write everything that comes before the rows of the table
+
+        That's the styles, the HTML before the table in the template, the
+        caption and the column headers
+
+        Args:
+            columns: The columns of the table
+            f: The file the HTML is written to
+        """
+        f.write(self.style(columns))
+        f.write(self.before)
+        attributes = f" {self.table_attributes}" if self.table_attributes else ""
+        f.write(f'<table id="{self.table_id}" class="{self.table_id}"{attributes}>\n')
+        if self.caption:
+            f.write(f"  <caption>{self.caption}</caption>\n")
+        f.write("  <thead>\n    <tr>\n")
+        for i, column in enumerate(columns):
+            f.write(f'      <th class="col_heading level0 col{i}" >{column}</th>\n')
+        f.write("    </tr>\n  </thead>\n  <tbody>\n")
+
+    def write_rows(self, df: pd.DataFrame, f: TextIO) -> None:
+        """Write rows of the table, formatting `chunksize` rows at a time
+
+        Args:
+            df: The rows, already formatted as HTML if needed
+            f: The file the HTML is written to
+        """
+        for start in range(0, len(df), self.chunksize):
+            chunk = df.iloc[start : start + self.chunksize]
+            rows = np.full(len(chunk), "    <tr>\n", dtype=object)
+            for i, column in enumerate(chunk.columns):
+                rows = rows + f'      <td class="c{i}" >'
+                rows = rows + _as_text(chunk[column]) + "</td>\n"
+            f.writelines(rows + "    </tr>\n")
+
+    def write_footer(self, f: TextIO) -> None:
+        """Close the table and write the HTML after it in the template
+
+        Args:
+            f: The file the HTML is written to
+        """
+        f.write("  </tbody>\n</table>\n")
+        f.write(self.after)
+
+    def write(self, df: pd.DataFrame, f: TextIO) -> None:
+        """Write the table to a text file
+
+        The index isn't written, like a Styler with the index hidden
+
+        Args:
+            df: The data of the table, already formatted as HTML if needed
+            f: The file the HTML is written to
+        """
+        self.write_header(df.columns, f)
+        self.write_rows(df, f)
+        self.write_footer(f)
+
+    def stream(self, chunks: Iterable[pd.DataFrame], f: TextIO) -> None:
+        """Write the table from chunks of rows as they are produced
+
+        The header goes out as soon as the first chunk is ready and the file
+        is flushed after every chunk. Only one chunk is held in memory at a
+        time, so the whole table never has to be built
+
+        Args:
+            chunks: The rows of the table in order, all with the same columns
+            f: The file, stdout or socket file the HTML is written to
+        """
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            raise ValueError("A table needs at least one chunk of rows")
+        self.write_header(first.columns, f)
+        self.write_rows(first, f)
+        f.flush()
+        for chunk in chunks:
+            self.write_rows(chunk, f)
+            f.flush()
+        self.write_footer(f)
+        f.flush()
+
+    def render(self, df: pd.DataFrame) -> str:
+        """Render the table to a string
+
+        Args:
+            df: The data of the table, already formatted as HTML if needed
+
+        Returns:
+            The HTML of the table
+        """
+        buffer = io.StringIO()
+        self.write(df, buffer)
+        return buffer.getvalue()
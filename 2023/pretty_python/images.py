@@ -0,0 +1,116 @@
+"""Decode the images drawn over the charts once and keep them on disk
+
+`plt.imread` decodes a PNG into a float RGBA array every time a chart is
+drawn, and an `OffsetImage` then resamples the whole array down to the few
+pixels it covers. `load_image` keeps the decoded array, already scaled, as a
+`.npy` file keyed by the path, modification time and size of the image and
+by the scale. Later runs map that file into memory instead of decoding it:
+
+    img = load_image("./oil-pump.png")
+    imagebox = offset_image("./images/coronavirus.png", zoom=0.08)
+
+The cache is kept in `.image-cache/` next to the chart and can be removed at
+any time
+"""
+import hashlib
+import os
+from typing import Optional
+
+import numpy as np
+
+CACHE_DIR = ".image-cache"
+
+
+def _cache_path(path: str, scale: float, cache_dir: str) -> str:
+    """The file the decoded and scaled array of an image is kept in"""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{scale!r}"
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{digest}.npy")
+
+
+def _to_rgba(img: np.ndarray) -> np.ndarray:
+    """Give gray and RGB images the channels of an opaque RGBA image"""
+    if img.ndim == 2:
+        img = np.stack([img] * 3, axis=-1)
+    if img.shape[2] == 3:
+        img = np.dstack([img, np.ones(img.shape[:2], dtype=img.dtype)])
+    return img
+
+
+def _scale_image(img: np.ndarray, scale: float) -> np.ndarray:
+    """Resample a float RGBA image with premultiplied alpha"""
+    from PIL import Image
+
+    height, width = img.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    image = Image.fromarray(np.round(img * 255).astype(np.uint8), "RGBA")
+    resized = image.convert("RGBa").resize(size, Image.LANCZOS).convert("RGBA")
+    return np.asarray(resized, dtype=np.float32) / 255
+
+
+def load_image(
+    path: str, scale: float = 1.0, cache_dir: Optional[str] = CACHE_DIR
+) -> np.ndarray:
+    """Read an image as `plt.imread` does, decoding it only once
+
+    Args:
+        path: The PNG file
+        scale: Resample the image by this factor, 1 to keep its size
+        cache_dir: The directory of the decoded arrays, None to always decode
+
+    Returns:
+        The float RGBA array of the image, read-only when it's from the cache
+    """
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = _cache_path(path, scale, cache_dir)
+        if os.path.exists(cache_path):
+            return np.load(cache_path, mmap_mode="r")
+
+    from matplotlib.image import imread
+
+    img = imread(path)
+    if scale != 1.0:
+        img = _scale_image(_to_rgba(img), scale)
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written aside and moved in place, so parallel builds never read half
+        # a file
+        with open(f"{cache_path}.tmp", "wb") as f:
+            np.save(f, img)
+        os.replace(f"{cache_path}.tmp", cache_path)
+    return img
+
+
+def offset_image(
+    path: str, zoom: float, dpi: float = 300, cache_dir: Optional[str] = CACHE_DIR
+):
+    """Build an `OffsetImage` from an image scaled to the pixels it covers
+
+    `OffsetImage(img, zoom=zoom)` draws every pixel of `img` as `zoom` points,
+    so at `dpi` the image covers `zoom * dpi / 72` output pixels per pixel of
+    the file. The image is resampled to that size once, and the zoom adjusted
+    to draw it the same size. For a chart exported at several sizes from one
+    draw, dpi is the largest resolution, the smaller sizes are downsampled
+    from that draw with the image in it, see `export.export_figure`
+
+    Args:
+        path: The PNG file
+        zoom: The zoom the full size image would be drawn with
+        dpi: The resolution the chart is saved at
+        cache_dir: The directory of the decoded arrays, None to always decode
+
+    Returns:
+        The offset image, to place with an `AnnotationBbox`
+    """
+    from matplotlib.offsetbox import OffsetImage
+    from PIL import Image
+
+    img = load_image(path, zoom * dpi / 72, cache_dir)
+    # Drawn at the size of the full image, whatever the rounding of its pixels.
+    # Only the header of the file is read for its width
+    with Image.open(path) as image:
+        width = image.width
+    return OffsetImage(img, zoom=zoom * width / img.shape[1])
@@ -0,0 +1,121 @@
+"""Check how long the report scripts take to import
+
+Every cron run of a report pays for its imports before doing any work. The
+table-only reports should not load the plotting stack or IPython at all, so
+this checks both the total import time and which modules were loaded
+
+The scripts are loaded the way `python script.py` would load them, from their
+own directory, but without running `main`. Run from `2023/`:
+
+    python -m pretty_python.importtime W14/olympic_stats.py --budget 500
+
+The exit status is 1 when a script goes over the budget or loads one of the
+heavy modules. `tests/test_importtime.py` runs the same check under pytest,
+with a budget of PRETTY_PYTHON_IMPORT_BUDGET milliseconds, 5 times BUDGET
+when it's not set
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import List, Sequence, Tuple
+
+# The scripts checked when none are given
+SCRIPTS = [
+    "W13/number-of-employees.py",
+    "W14/olympic_stats.py",
+    "30DayChartChallenge/Day02-waffle/waffle.py",
+]
+
+# The maximum import time of every script, in milliseconds
+BUDGET = 600
+
+# Modules a headless, table-only report should never load at import time
+HEAVY_MODULES = ["IPython", "matplotlib.pyplot", "seaborn", "jinja2"]
+
+# Import the script without running it and print the modules it loaded
+_LOADER = """\
+import json, runpy, sys
+sys.path.insert(0, ".")
+runpy.run_path(sys.argv[1], run_name="__importtime__")
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def _parse_importtime(stderr: str) -> float:
+    """Sum the self times of a `-X importtime` report, in milliseconds"""
+    total = 0
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            self_time = line[len("import time:") :].split("|")[0].strip()
+            if self_time.isdigit():
+                total += int(self_time)
+    return total / 1000
+
+
+def measure_imports(script: str) -> Tuple[float, List[str]]:
+    """Import a script in a fresh interpreter
+
+    Args:
+        script: The path of the script
+
+    Returns:
+        The total import time in milliseconds and the modules loaded
+    """
+    directory, name = os.path.split(os.path.abspath(script))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _LOADER, name],
+        cwd=directory,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return _parse_importtime(result.stderr), json.loads(result.stdout)
+
+
+def check_scripts(scripts: Sequence[str], budget: float, repeat: int = 3) -> bool:
+    """Check that every script stays within the import time budget
+
+    Args:
+        scripts: The paths of the scripts
+        budget: The maximum import time in milliseconds
+        repeat: The number of measurements, the fastest one is kept
+
+    Returns:
+        Whether all the scripts passed
+    """
+    passed = True
+    for script in scripts:
+        measurements = [measure_imports(script) for _ in range(repeat)]
+        milliseconds = min(elapsed for elapsed, _ in measurements)
+        modules = set(measurements[0][1])
+        heavy = [module for module in HEAVY_MODULES if module in modules]
+        ok = milliseconds <= budget and not heavy
+        passed = passed and ok
+        print(
+            f"{'ok' if ok else 'FAIL':4} {script}: {milliseconds:.0f} ms"
+            + (f", loads {', '.join(heavy)}" if heavy else "")
+        )
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the import time of the report scripts"
+    )
+    parser.add_argument("scripts", nargs="*", default=SCRIPTS)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=BUDGET,
+        help="Maximum import time of every script in milliseconds",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of measurements per script, the fastest one is kept",
+    )
+    args = parser.parse_args()
+    sys.exit(0 if check_scripts(args.scripts, args.budget, args.repeat) else 1)
@@ -0,0 +1,96 @@
+"""Load the tables used by the charts
+
+CSV files are parsed from text on every run, even when a chart only needs a
+couple of their columns. `load_table` converts a CSV file to Feather once and
+reads only the requested columns from it afterwards, memory-mapping the file.
+Parquet and Feather files can also be passed directly
+
+Reading and writing columnar files needs `pyarrow`. Without it, CSV files are
+still read with only the requested columns
+"""
+import os
+from typing import List, Optional
+
+import pandas as pd
+
+
+def _pyarrow_available() -> bool:
+    """Check if pyarrow can be imported"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def columnar_path(path: str) -> str:
+    """The Feather file a CSV file is converted to
+
+    Args:
+        path: The path of the CSV file
+
+    Returns:
+        The path of the Feather file next to it
+    """
+    return os.path.splitext(path)[0] + ".feather"
+
+
+def read_columnar(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read a Parquet or Feather file, memory-mapping it
+
+    Args:
+        path: The path of the file
+        columns: The columns to read, all of them when None
+
+    Returns:
+        The table with the requested columns
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    else:
+        import pyarrow.feather as feather
+
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    df = table.to_pandas()
+    return df if columns is None else df[columns]
+
+
+def load_table(
+    path: str, columns: Optional[List[str]] = None, convert: bool = True, **kwargs
+) -> pd.DataFrame:
+    """Load a table, reading only the columns a chart needs
+
+    Parquet and Feather files are read directly. For a CSV file we look for
+    its Feather conversion first and use it if it's newer than the CSV. If
+    there isn't one, the CSV is parsed with `kwargs` and converted to Feather
+    so the next run can skip parsing. Without pyarrow the CSV is parsed
+    every time, but still only for the requested columns
+
+    Args:
+        path: The path of a CSV, Parquet or Feather file
+        columns: The columns to read, all of them when None
+        convert: Whether to store the Feather conversion of a CSV file
+        **kwargs: Passed to `pd.read_csv`, e.g. `thousands=","`
+
+    Returns:
+        The table with the requested columns, in the requested order
+    """
+    if path.endswith((".parquet", ".feather")):
+        return read_columnar(path, columns)
+
+    cached = columnar_path(path)
+    if _pyarrow_available():
+        if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(
+            path
+        ):
+            return read_columnar(cached, columns)
+        if convert:
+            # The whole file is converted, so other charts can use it as well
+            df = pd.read_csv(path, **kwargs)
+            df.to_feather(cached)
+            return df if columns is None else df[columns]
+
+    df = pd.read_csv(path, usecols=columns, **kwargs)
+    return df if columns is None else df[columns]
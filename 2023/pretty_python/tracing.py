@@ -0,0 +1,193 @@
+"""Record how long every stage of a chart takes, when asked to
+
+Tracing is turned on by setting PRETTY_PYTHON_TRACE to the file the stages
+are recorded in, e.g. when running a chart or the whole gallery:
+
+    PRETTY_PYTHON_TRACE=trace.jsonl python olympic_stats.py
+    PRETTY_PYTHON_TRACE=trace.json python -m pretty_python.build --force
+
+A relative path is relative to the directory the chart is run from, so the
+build writes one trace per chart. For every stage the wall time, the CPU
+time, the peak RSS of the process and the size of its output are recorded.
+A path ending with `.json` gets a Chrome trace, to open in `chrome://tracing`
+or Perfetto, any other path gets one JSON object per line
+
+The stages are the functions decorated with `traced` and the blocks wrapped
+in `stage`. Without the variable, they only cost a check of a global
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_ENV = "PRETTY_PYTHON_TRACE"
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """The peak resident memory of the process so far, in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes on Linux
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class Tracer:
+    """Collect the stages of a process and write them to a file
+
+    Args:
+        path: The file the stages are written to, a Chrome trace if it ends
+            with `.json` and JSON lines otherwise
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.chrome = path.endswith(".json")
+        self.chart = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        self.origin = time.perf_counter()
+        self.events: List[Dict] = []
+
+    def record(
+        self, name: str, start: float, wall: float, cpu: float, output: Optional[int]
+    ) -> None:
+        """Record a finished stage
+
+        Args:
+            name: The name of the stage
+            start: When the stage started, from `time.perf_counter`
+            wall: The wall time of the stage in seconds
+            cpu: The CPU time of the stage in seconds
+            output: The size of the output of the stage in bytes, if known
+        """
+        event = {
+            "chart": self.chart,
+            "stage": name,
+            "pid": os.getpid(),
+            "start_s": start - self.origin,
+            "wall_s": wall,
+            "cpu_s": cpu,
+            "peak_rss_mb": _peak_rss_mb(),
+            "output_bytes": output,
+        }
+        if self.chrome:
+            self.events.append(event)
+        else:
+            # Appended right away, so a crash keeps the stages done so far
+            with open(self.path, "a") as f:
+                f.write(json.dumps(event) + "\n")
+
+    def write(self) -> None:
+        """Write the Chrome trace of the stages recorded"""
+        if not self.chrome:
+            return
+        trace = {
+            "traceEvents": [
+                {
+                    "name": event["stage"],
+                    "cat": event["chart"],
+                    "ph": "X",
+                    "ts": event["start_s"] * 1e6,
+                    "dur": event["wall_s"] * 1e6,
+                    "pid": event["pid"],
+                    "tid": 0,
+                    "args": {
+                        "cpu_ms": event["cpu_s"] * 1000,
+                        "peak_rss_mb": event["peak_rss_mb"],
+                        "output_bytes": event["output_bytes"],
+                    },
+                }
+                for event in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+        with open(self.path, "w") as f:
+            json.dump(trace, f)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable(path: str) -> Tracer:
+    """Start tracing the stages of the process
+
+    Called on import when PRETTY_PYTHON_TRACE is set
+
+    Args:
+        path: The file the stages are written to
+
+    Returns:
+        The tracer of the process
+    """
+    global _tracer
+    _tracer = Tracer(path)
+    atexit.register(_tracer.write)
+    return _tracer
+
+
+def _output_size(output: Optional[str], result: object) -> Optional[int]:
+    """The size of a file written by a stage, or of the text it returned"""
+    if output is not None and os.path.exists(output):
+        return os.path.getsize(output)
+    if isinstance(result, str):
+        return len(result.encode("utf-8"))
+    if isinstance(result, bytes):
+        return len(result)
+    return None
+
+
+class _Stage:
+    """The result of a stage, set by the code inside a `stage` block"""
+
+    result: object = None
+
+
+@contextmanager
+def stage(name: str, output: Optional[str] = None) -> Iterator[_Stage]:
+    """Trace a block of code as a stage
+
+    Args:
+        name: The name of the stage, e.g. "savefig"
+        output: The file written by the stage, its size is recorded
+
+    Yields:
+        An object whose `result` can be set to the text the stage produced,
+        to record its size
+    """
+    current = _Stage()
+    if _tracer is None:
+        yield current
+        return
+    start, cpu = time.perf_counter(), time.process_time()
+    yield current
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+    _tracer.record(name, start, wall, cpu, _output_size(output, current.result))
+
+
+def traced(func: Callable) -> Callable:
+    """Trace every call of a function as a stage named after it
+
+    When the function returns text, its size is recorded as the output
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _tracer is None:
+            return func(*args, **kwargs)
+        with stage(func.__name__) as current:
+            current.result = func(*args, **kwargs)
+        return current.result
+
+    return wrapper
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
@@ -0,0 +1,305 @@
+"""Fit a polynomial trend incrementally as rows are appended to a dataset
+
+`np.polyfit(x, y, degree)` goes over the whole history every time a chart is
+drawn. A least squares polynomial only depends on the sums of its normal
+equations, the sums of x**k for k up to 2 * degree and of y * x**k for k up
+to degree, so these are kept in a state file instead. A run adds the rows
+appended since the previous one to the sums and solves a system of
+degree + 1 equations:
+
+    trend = update_trend(df["year"], df["value_gbp"], degree=3, key="transfers")
+    grid = np.linspace(1980, 2020, 50)
+    ax.plot(grid, trend(grid))
+
+The rows are counted in blocks of BLOCK_ROWS, each with its own sums and a
+digest of its values. A run only reads the last block counted and the rows
+after it, so it takes time in the rows appended rather than in the whole
+history. Rows changed in an earlier block are found with `verify=True` or
+when the dataset shrank, then only the blocks that changed are counted again.
+`check_trend` compares the trend with an independent least squares fit over
+all rows. The state is kept in `.trend-state.json` next to the chart and can
+be removed at any time
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+STATE_FILE = ".trend-state.json"
+
+# The difference allowed between a trend kept up to date and a least squares
+# fit over all rows, relative to its largest coefficient
+RTOL = 1e-6
+
+# The rows of a block of the sums, see `PolynomialTrend.update`
+BLOCK_ROWS = 2**16
+
+# The rows factored at a time by `least_squares`
+CHUNK_ROWS = 2**20
+
+
+def rows_digest(x: np.ndarray, y: np.ndarray) -> str:
+    """Fingerprint the values of some rows
+
+    Args:
+        x: The x values
+        y: The y values
+
+    Returns:
+        The SHA-256 of the values, as float64
+    """
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(x, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def least_squares(
+    t: np.ndarray, y: np.ndarray, degree: int, chunk_rows: int = CHUNK_ROWS
+) -> np.ndarray:
+    """Fit a polynomial by least squares, a chunk of rows at a time
+
+    A single `np.linalg.lstsq` or `Polynomial.fit` over millions of rows
+    returns wrong coefficients with some LAPACK builds. Every chunk is stacked
+    under the R factor of the rows before it and factored again with QR, so
+    no factorization has more than chunk_rows + degree + 1 rows
+
+    Args:
+        t: The x values, preferably centered and scaled
+        y: The y values
+        degree: The degree of the polynomial
+        chunk_rows: The rows factored at a time
+
+    Returns:
+        The coefficients in t, lowest degree first
+    """
+    r = np.zeros((0, degree + 1))
+    qty = np.zeros(0)
+    for start in range(0, len(t), chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        q, r = np.linalg.qr(np.vstack([r, np.vander(t[rows], degree + 1, True)]))
+        qty = q.T @ np.concatenate([qty, y[rows]])
+    return np.linalg.lstsq(r, qty, rcond=None)[0]
+
+
+class PolynomialTrend:
+    """A least squares polynomial fitted from the sums of its normal equations
+
+    The powers of x get large quickly, e.g. years to the 6th power, so the
+    sums are of t = (x - origin) / scale, with origin and scale fixed when the
+    first rows are added. The rows are counted in blocks of BLOCK_ROWS, every
+    block keeps its own sums and digest, see `update`
+
+    Args:
+        degree: The degree of the polynomial
+        origin: The x mapped to t = 0, usually the middle of the first rows
+        scale: The distance in x mapped to a distance of 1 in t
+    """
+
+    def __init__(self, degree: int = 3, origin: float = 0.0, scale: float = 1.0):
+        self.degree = degree
+        self.origin = origin
+        self.scale = scale
+        # Per block, its rows, digest, sums of t**k for k in 0..2 * degree and
+        # sums of y * t**k for k in 0..degree
+        self.blocks: List[Dict] = []
+
+    @classmethod
+    def for_data(cls, x: np.ndarray, degree: int = 3) -> "PolynomialTrend":
+        """Create an empty trend centered on some x values
+
+        Args:
+            x: The x values, e.g. the first rows
+            degree: The degree of the polynomial
+
+        Returns:
+            The trend, without any rows added
+        """
+        low, high = (float(x.min()), float(x.max())) if len(x) else (0.0, 0.0)
+        return cls(degree, (low + high) / 2, (high - low) / 2 or 1.0)
+
+    @property
+    def rows(self) -> int:
+        """The number of rows counted"""
+        return sum(block["rows"] for block in self.blocks)
+
+    @property
+    def moments(self) -> np.ndarray:
+        """Sums of t**k for k in 0..2 * degree over all rows"""
+        return np.sum([block["moments"] for block in self.blocks], axis=0)
+
+    @property
+    def targets(self) -> np.ndarray:
+        """Sums of y * t**k for k in 0..degree over all rows"""
+        return np.sum([block["targets"] for block in self.blocks], axis=0)
+
+    def _count(self, x: np.ndarray, y: np.ndarray, digest: str) -> Dict:
+        """The sums of the normal equations over the rows of a block"""
+        powers = np.vander((x - self.origin) / self.scale, 2 * self.degree + 1, True)
+        return {
+            "rows": len(x),
+            "digest": digest,
+            "moments": powers.sum(axis=0).tolist(),
+            "targets": (y @ powers[:, : self.degree + 1]).tolist(),
+        }
+
+    def update(self, x: np.ndarray, y: np.ndarray, verify: bool = False) -> int:
+        """Bring the sums up to date with a dataset rows are appended to
+
+        Only the last block counted and the blocks after it are read. The
+        full blocks before it are assumed unchanged unless verify is set or
+        the dataset shrank, then the digest of every block is compared and
+        only the blocks that changed are counted again
+
+        Args:
+            x: The x values of all rows, in the order they were appended
+            y: The y values of all rows
+            verify: Compare the digest of every block counted so far
+
+        Returns:
+            The number of blocks counted, 0 when the sums were up to date
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        verify = verify or len(x) < self.rows
+        del self.blocks[-(-len(x) // BLOCK_ROWS) :]
+        counted = 0
+        first = 0 if verify else max(len(self.blocks) - 1, 0)
+        for start in range(first * BLOCK_ROWS, len(x), BLOCK_ROWS):
+            index = start // BLOCK_ROWS
+            rows = slice(start, start + BLOCK_ROWS)
+            digest = rows_digest(x[rows], y[rows])
+            if index < len(self.blocks):
+                if self.blocks[index]["digest"] != digest:
+                    self.blocks[index] = self._count(x[rows], y[rows], digest)
+                    counted += 1
+            else:
+                self.blocks.append(self._count(x[rows], y[rows], digest))
+                counted += 1
+        return counted
+
+    def _solve(self) -> np.ndarray:
+        """The coefficients in t, lowest degree first"""
+        if self.rows <= self.degree:
+            raise ValueError(
+                f"A trend of degree {self.degree} needs more than {self.degree} "
+                f"rows, got {self.rows}"
+            )
+        powers = np.add.outer(np.arange(self.degree + 1), np.arange(self.degree + 1))
+        return np.linalg.solve(self.moments[powers], self.targets)
+
+    @property
+    def coefficients(self) -> np.ndarray:
+        """The coefficients in x, highest degree first like `np.polyfit`"""
+        in_t = np.poly1d(self._solve()[::-1])
+        return (in_t(np.poly1d([1 / self.scale, -self.origin / self.scale]))).coeffs
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        """Evaluate the trend
+
+        Args:
+            x: The x values
+
+        Returns:
+            The trend at every x value
+        """
+        t = (np.asarray(x, dtype=float) - self.origin) / self.scale
+        return np.polyval(self._solve()[::-1], t)
+
+    def to_dict(self) -> Dict:
+        """The state of the trend, to store as JSON"""
+        return {
+            "degree": self.degree,
+            "origin": self.origin,
+            "scale": self.scale,
+            "block_rows": BLOCK_ROWS,
+            "blocks": self.blocks,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> "PolynomialTrend":
+        """Restore a trend stored with `to_dict`"""
+        trend = cls(state["degree"], state["origin"], state["scale"])
+        trend.blocks = state["blocks"]
+        return trend
+
+
+def update_trend(
+    x: Sequence[float],
+    y: Sequence[float],
+    degree: int = 3,
+    key: str = "",
+    state_file: Optional[str] = STATE_FILE,
+    verify: bool = False,
+) -> PolynomialTrend:
+    """Fit a trend to a dataset, counting only the rows appended since last time
+
+    Args:
+        x: The x values of all rows, in the order they were appended
+        y: The y values of all rows
+        degree: The degree of the polynomial
+        key: The name of the dataset, every dataset has its own sums
+        state_file: The JSON file the sums are kept in, None to always count
+            every row
+        verify: Also look for rows changed before the last block counted, see
+            `PolynomialTrend.update`
+
+    Returns:
+        The trend fitted to all rows
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    states = {}
+    if state_file is not None and os.path.exists(state_file):
+        with open(state_file) as f:
+            states = json.load(f)
+
+    state = states.get(key)
+    # States of another degree or block size are started over
+    if (
+        state is not None
+        and state["degree"] == degree
+        and state.get("block_rows") == BLOCK_ROWS
+    ):
+        trend = PolynomialTrend.from_dict(state)
+    else:
+        trend = PolynomialTrend.for_data(x, degree)
+    if trend.update(x, y, verify) and state_file is not None:
+        states[key] = trend.to_dict()
+        with open(state_file, "w") as f:
+            json.dump(states, f, indent=2)
+    return trend
+
+
+def check_trend(
+    trend: PolynomialTrend, x: Sequence[float], y: Sequence[float], rtol: float = RTOL
+) -> float:
+    """Compare a trend kept up to date with a least squares refit over all rows
+
+    The refit is `least_squares`, which solves the least squares problem of
+    the rows themselves instead of the normal equations. Its coefficients are
+    compared in t, where they are all of the same magnitude
+
+    Args:
+        trend: The trend, e.g. from `update_trend`
+        x: The x values of all rows
+        y: The y values of all rows
+        rtol: The difference allowed, relative to the largest coefficient
+
+    Returns:
+        The largest difference of the coefficients, relative to the largest one
+
+    Raises:
+        ValueError: When the trend differs from the refit by more than rtol
+    """
+    t = (np.asarray(x, dtype=float) - trend.origin) / trend.scale
+    expected = least_squares(t, np.asarray(y, dtype=float), trend.degree)
+    difference = np.abs(trend._solve() - expected).max() / np.abs(expected).max()
+    if difference > rtol:
+        raise ValueError(
+            "The trend differs from a least squares refit over all rows by "
+            f"{difference:.2g}"
+        )
+    return difference
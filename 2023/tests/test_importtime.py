@@ -0,0 +1,19 @@
+"""The report scripts import within their budget, without the plotting stack"""
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from pretty_python.importtime import BUDGET, SCRIPTS, check_scripts  # noqa: E402
+
+# Wall time depends on the machine and its load, so by default only large
+# regressions fail. The heavy modules are checked whatever the budget
+TEST_BUDGET = float(os.environ.get("PRETTY_PYTHON_IMPORT_BUDGET", 5 * BUDGET))
+
+
+def test_report_scripts_import_within_budget(monkeypatch):
+    # The scripts are listed relative to 2023/
+    monkeypatch.chdir(ROOT)
+    assert check_scripts(SCRIPTS, TEST_BUDGET)